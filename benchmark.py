@@ -0,0 +1,280 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+import identifier
+from identifier import *
+
+##################################### PARAMETERS #####################################
+
+# Sizes of the synthetic circular genomes in nucleotides
+genome_sizes = [250_000, 1_000_000]
+
+# GC content of the synthetic genomes and genes
+gc_content = 0.3
+
+# Number and length of the synthetic genes, taken from both strands of the genome
+nb_genes = 40
+gene_length = 1200
+
+# Number of candidates checked with check_off_target and of alignments done with step_off_target
+nb_checked_candidates = 10
+nb_alignments = 20000
+
+# Numbers of processes of the end-to-end analyses, to measure the scaling
+processes_counts = sorted({1, 2, 4, cpu_count()})
+
+# Seed of the random generator, the synthetic data being the same from one run to the next
+random_seed = 0
+
+# Bundled example analysed end to end
+example_directory = os.path.join("data", "CDS_mbov_PG45_example")
+
+######################################################################################
+
+def generate_genome(size: int, gc_content: float, rng: random.Random):
+    """Generate a random genome sequence.
+
+    Args:
+        size (int): number of nucleotides
+        gc_content (float): proportion of G and C nucleotides
+        rng (random.Random): random generator
+
+    Returns:
+        str: genome sequence
+    """
+    return "".join(rng.choices("ACGT", weights=[1 - gc_content, gc_content, gc_content, 1 - gc_content], k=size))
+
+def generate_genes(genome: str, nb_genes: int, gene_length: int, rng: random.Random):
+    """Generate genes taken from both strands of a circular genome, with a few mutations so that they have replicas and off-targets.
+
+    Args:
+        genome (str): genome sequence
+        nb_genes (int): number of genes
+        gene_length (int): length of the genes, rounded to a number of codons
+        rng (random.Random): random generator
+
+    Returns:
+        list: names and sequences of the genes
+    """
+    gene_length -= gene_length % 3
+    circular_genome = genome + genome[:gene_length]
+    genes = []
+    for i in range(nb_genes):
+        start = rng.randrange(len(genome))
+        gene = list(circular_genome[start:start+gene_length])
+        for _ in range(gene_length // 100):
+            gene[rng.randrange(gene_length)] = rng.choice("ACGT")
+        gene = "".join(gene)
+        if i % 2 == 1:
+            gene = get_CI_sequence(gene)
+        genes.append((f">gene_{i+1} start={start} strand={'complementary' if i % 2 else 'coding'}", gene))
+    return genes
+
+def write_fasta(path: str, records: list, line_length: int = 80):
+    """Write records in a FASTA file, the sequences being wrapped.
+
+    Args:
+        path (str): path of the file
+        records (list): headers and sequences of the records
+        line_length (int): length of the sequence lines
+    """
+    with open(path, "w") as file:
+        for header, sequence in records:
+            file.write(header + "\n")
+            for i in range(0, len(sequence), line_length):
+                file.write(sequence[i:i+line_length] + "\n")
+
+def measure(function, repeat: int = 3):
+    """Measure the duration of a function.
+
+    Args:
+        function (function): function without argument
+        repeat (int): number of runs, the fastest being kept
+
+    Returns:
+        float: duration in seconds
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+def get_version():
+    """Get the version of the repository measured.
+
+    Returns:
+        str: git commit of the repository, None if unknown
+    """
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark_functions(genome: str, genes: list):
+    """Measure the functions of the identification separately on a genome and its genes.
+
+    Args:
+        genome (str): genome sequence
+        genes (list): names and sequences of the genes
+
+    Returns:
+        dict: duration and throughput of each function
+    """
+    rng = random.Random(random_seed)
+    size = len(genome) / 1e6
+    gene_size = sum(len(gene) for _, gene in genes) / 1e6
+    results = {}
+
+    duration = measure(lambda: get_CI_sequence(genome))
+    results["get_CI_sequence"] = {"seconds": duration, "mbp_per_second": size / duration}
+
+    def find_all_sequences():
+        for _, gene in genes:
+            for target in targets:
+                if target[2] == "complementary":
+                    find_sequences(get_CI_sequence(gene), get_CI_sequence(target[0]), 2 - target[1], target[2], pams, deaminase_window)
+                else:
+                    find_sequences(gene, target[0], target[1], target[2], pams, deaminase_window)
+    duration = measure(find_all_sequences)
+    results["find_sequences"] = {"seconds": duration, "mbp_per_second": gene_size / duration}
+
+    finder = compile_candidate_finder(targets, pams, deaminase_window)
+    duration = measure(lambda: [find_candidates(finder, gene) for _, gene in genes])
+    results["find_candidates"] = {"seconds": duration, "mbp_per_second": gene_size / duration}
+
+    # Off-targets of a few candidates with a full scan of the genome, index included
+    candidates = [sequence for _, gene in genes for sequence in find_candidates(finder, gene)]
+    checked = rng.sample(candidates, min(nb_checked_candidates, len(candidates)))
+    duration = measure(lambda: [check_off_target(candidate, genome, concordance_threshold, allowed_mismatches, allowed_gaps) for candidate in checked], 1)
+    results["check_off_target"] = {"seconds": duration, "candidates": len(checked), "seconds_per_candidate": duration / max(len(checked), 1), "mbp_per_second": size * len(checked) / duration}
+
+    # Off-targets of every candidate with the genome index built once
+    genome_index = build_genome_index(genome, pams, get_seed_length(concordance_threshold, allowed_mismatches, allowed_gaps))
+    duration = measure(lambda: [search_off_target(candidate, genome_index[strand], concordance_threshold, allowed_mismatches, allowed_gaps) for candidate in candidates for strand in ("coding", "complementary")], 1)
+    results["search_off_target"] = {"seconds": duration, "candidates": len(candidates), "seconds_per_candidate": duration / max(len(candidates), 1)}
+
+    # Alignments of the protospacers at random PAM sites
+    sites = genome_index["coding"]["pam_sites"][pams[0]]
+    alignments = [(rng.choice(candidates)["sequence"][:-3], rng.choice(sites)) for _ in range(nb_alignments)] if len(candidates) > 0 and len(sites) > 0 else []
+    sequence = genome_index["coding"]["sequence"]
+    def align():
+        off_targets = []
+        for protospacer, site in alignments:
+            step_off_target(off_targets, protospacer, get_genome_window(sequence, site, len(protospacer)), site, concordance_threshold, allowed_mismatches, allowed_gaps, result=sequence[site:site+3])
+    duration = measure(align)
+    results["step_off_target"] = {"seconds": duration, "alignments": len(alignments), "alignments_per_second": len(alignments) / duration}
+
+    return results
+
+def benchmark_analysis(dir_path: str, fasta_file: str, genome_file: str, size: int):
+    """Measure the end-to-end analysis of a repository for every number of processes, without any cache.
+
+    Args:
+        dir_path (str): directory path
+        fasta_file (str): fasta file name
+        genome_file (str): genome file name
+        size (int): size of the genome
+
+    Returns:
+        dict: duration, throughput and speedup of each number of processes and search mode
+    """
+    results = {}
+    for batch in (False, True):
+        mode = "batch" if batch else "entry"
+        results[mode] = {}
+        for nb in processes_counts:
+            duration = measure(lambda: analyse_fasta_file(dir_path, fasta_file, genome_file, True, targets, pams, deaminase_window, concordance_threshold, allowed_mismatches, nb, batch), 1)
+            results[mode][nb] = {"seconds": duration, "mbp_per_second": size / 1e6 / duration, "speedup": results[mode][processes_counts[0]]["seconds"] / duration if nb != processes_counts[0] else 1.0}
+    return results
+
+def run_benchmarks():
+    """Run the benchmarks on the synthetic genomes and on the bundled example.
+
+    Returns:
+        dict: environment, parameters and results of the benchmarks
+    """
+    # The caches would hide the cost of the identification
+    identifier.index_cache_directory = None
+    identifier.off_target_cache_file = None
+    identifier.checkpoint_runs = False
+    identifier.result_formats = ["txt"]
+
+    report = {"version": get_version(),
+              "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+              "python": platform.python_version(),
+              "numpy": np is not None,
+              "cpu_count": cpu_count(),
+              "parameters": {"targets": targets, "pams": pams, "deaminase_window": deaminase_window, "concordance_threshold": concordance_threshold,
+                             "allowed_mismatches": allowed_mismatches, "allowed_gaps": allowed_gaps, "gc_content": gc_content,
+                             "nb_genes": nb_genes, "gene_length": gene_length, "random_seed": random_seed},
+              "results": {}}
+
+    rng = random.Random(random_seed)
+    for size in genome_sizes:
+        name = f"synthetic_{size}"
+        print(f"Benchmarking {name}...")
+        genome = generate_genome(size, gc_content, rng)
+        genes = generate_genes(genome, nb_genes, gene_length, rng)
+        with tempfile.TemporaryDirectory() as dir_path:
+            write_fasta(os.path.join(dir_path, "genome.fa"), [(">genome", genome)])
+            write_fasta(os.path.join(dir_path, "genes.fasta"), genes)
+            report["results"][name] = {"functions": benchmark_functions(genome, genes),
+                                       "analysis": benchmark_analysis(dir_path, "genes.fasta", "genome.fa", size)}
+
+    if os.path.isdir(example_directory):
+        print("Benchmarking the example...")
+        fasta_file = next(file for file in os.listdir(example_directory) if file.endswith(FASTA_EXTENSIONS))
+        genome_file = next(file for file in os.listdir(example_directory) if file.endswith(GENOME_EXTENSIONS))
+        with tempfile.TemporaryDirectory() as dir_path:
+            for file in (fasta_file, genome_file):
+                with open(os.path.join(example_directory, file), "rb") as source, open(os.path.join(dir_path, file), "wb") as copy:
+                    copy.write(source.read())
+            size = sum(len(contig["sequence"]) for contig in read_genome(os.path.join(dir_path, genome_file)))
+            report["results"]["example"] = {"analysis": benchmark_analysis(dir_path, fasta_file, genome_file, size)}
+
+    return report
+
+def compare_benchmarks(reference: dict, report: dict):
+    """Print the ratio between the durations of two benchmarks, above 1 when the second one is slower.
+
+    Args:
+        reference (dict): results of the reference benchmark
+        report (dict): results of the compared benchmark
+    """
+    def durations(results, path = ""):
+        for key, value in results.items():
+            if isinstance(value, dict):
+                if "seconds" in value:
+                    yield f"{path}{key}", value["seconds"]
+                else:
+                    yield from durations(value, f"{path}{key}/")
+
+    reference_durations = dict(durations(reference["results"]))
+    print(f"{reference['version']} -> {report['version']}")
+    for name, duration in durations(report["results"]):
+        if name in reference_durations:
+            print(f"    {name}: {reference_durations[name]:.3f}s -> {duration:.3f}s ({duration / reference_durations[name]:.2f}x)")
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the deaminase target identifier.")
+    parser.add_argument("-o", "--output", help="JSON file where the results are saved", default=f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    parser.add_argument("-c", "--compare", help="JSON file of a previous benchmark to compare the results with")
+    args = parser.parse_args()
+
+    report = run_benchmarks()
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=4)
+    print(f"Results saved in {args.output}")
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            compare_benchmarks(json.load(file), report)
@@ -1,6 +1,23 @@
+import gzip
+import cProfile
+import hashlib
+import json
+import mmap
 import os
+import pstats
+import re
+import shutil
+import sqlite3
+import tempfile
 import time
-from multiprocessing import Process, Queue, cpu_count
+from array import array
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+from itertools import product
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import cpu_count
+from multiprocessing.shared_memory import SharedMemory
 
 try:
     from tqdm import tqdm
@@ -8,6 +25,11 @@ except ImportError:
     def tqdm(iterable, *args, **kwargs):
         return iterable
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 ##################################### PARAMETERS #####################################
 
 # Target codons for the deaminase with the index of the target nucleotide in the codon 
@@ -37,6 +59,58 @@ allowed_gaps = 1
 # Number of processes to use for the identification
 nb_processes = cpu_count()
 
+# Estimated number of genome sites checked by each task, smaller tasks balance the load better between the processes
+chunk_cost = 10**6
+
+# Maximal time in seconds to wait for a task to complete before stopping the analysis (None to wait forever)
+task_timeout = None
+
+# Number of shards of the genome searched in parallel for each task, splitting the search of a few candidates between the processes
+# (None to shard the genome only when there are fewer tasks than processes)
+genome_shards = None
+
+# Check the off-targets of all the FASTA entries in a single sweep of the genome
+batch_search = True
+
+# Number of FASTA entries checked by each single sweep, their results being written and saved in the checkpoint as soon as they are swept
+# (None to check all the entries in the same sweep)
+batch_entries = 1000
+
+# Maximal length of the seeds indexed in the genome to find the off-targets
+max_seed_length = 10
+
+# Directory where the genome indexes are cached between runs (None to disable the cache) and maximal size of the cache in bytes
+index_cache_directory = os.path.join(os.path.expanduser("~"), ".cache", "dti")
+index_cache_size = 2 * 1024**3
+
+# File where the off-targets of the candidates are cached between runs, for instance os.path.join(index_cache_directory, "off_targets.db")
+# (None to disable the cache, the identical candidates of a run still being searched once), and maximal size of the cached off-targets in bytes
+off_target_cache_file = None
+off_target_cache_size = 256 * 1024**2
+
+# Record the time spent in each stage of the analysis and the counters of the search, saved in a metrics file with the results,
+# and profile the processes with cProfile, the merged profile being saved with the results
+collect_metrics = False
+profile_runs = False
+
+# Save the results of each entry to resume an interrupted analysis, and only analyse the new or modified entries when a repository is analysed again
+checkpoint_runs = True
+
+# Formats of the result files: "txt" report, "jsonl" one JSON line per candidate, "tsv" one row per candidate, replica or off-target
+result_formats = ["txt"]
+
+# Screening mode: maximal number of off-targets of a candidate, its search stopping as soon as it is exceeded (None to search all the off-targets),
+# and number of candidates reported for each entry, ranked by specificity score (None to report all the candidates)
+off_target_budget = None
+top_candidates = None
+
+# Parameter sweep: values of the parameters above evaluated in a single run, every combination being summarized in a table (empty to run the identification)
+# Example: {"concordance_threshold": [13, 15], "allowed_mismatches": [0, 1]} evaluates 4 configurations sharing the genome index, the candidates and the off-targets
+parameter_sweep = {}
+
+# Names of the genome contigs which are linear, the other contigs are circular unless their header contains "topology=linear"
+linear_contigs = []
+
 ######################################################################################
 
 
@@ -77,256 +151,2531 @@ def find_sequences(string: str, target: str, target_id: int, deaminase_strand: s
                                             "deaminase_strand": deaminase_strand})
     return results
 
+def compile_candidate_finder(targets: list, pams: list, deaminase_window: list):
+    """Compile the targets, the PAMs and the deaminase window to find the possible sequences of every target in a single pass over each strand.
+
+    Args:
+        targets (list): list of target codons with the index of the target nucleotide in the codon
+        pams (list): list of PAM sequences
+        deaminase_window (list): upper and lower bounds of the deaminase window
+
+    Returns:
+        dict: target codons searched on each strand with the bounds of their PAM positions, patterns of the codons and the PAMs and PAMs matching each 3-mer
+    """
+    strands = {}
+    for n, (codon, target_id, deaminase_strand) in enumerate(targets):
+        strand = "complementary" if deaminase_strand == "complementary" else "coding"
+        if strand == "complementary":
+            codon = get_CI_sequence(codon)
+            target_id = 2 - target_id
+        strands.setdefault(strand, {}).setdefault(codon, []).append((n, deaminase_strand, deaminase_window[0] + target_id, deaminase_window[1] + target_id))
+
+    return {"nb_targets": len(targets),
+            "strands": strands,
+            "codon_patterns": {strand: re.compile("(?=(" + "|".join(re.escape(codon) for codon in codons) + "))") for strand, codons in strands.items()},
+            "pams": [(pam, get_pam_pattern(pam[:3])) for pam in pams],
+            "pam_table": {}}
+
+def find_candidates(finder: dict, sample: str):
+    """Find the possible sequences of every target in a sample, as find_sequences does target by target.
+
+    Args:
+        finder (dict): compiled targets, PAMs and deaminase window, see compile_candidate_finder
+        sample (str): sequence of nucleotides
+
+    Returns:
+        list: list of the possible sequences, ordered by target
+    """
+    results = [[] for _ in range(finder["nb_targets"])]
+    pam_table = finder["pam_table"]
+    for strand, codons in finder["strands"].items():
+        string = get_CI_sequence(sample) if strand == "complementary" else sample
+        last_site = len(string) - 3
+
+        # Target codons in the reading frame of the string
+        for match in finder["codon_patterns"][strand].finditer(string):
+            i = match.start()
+            if i % 3 != 0:
+                continue
+            codon = match.group(1)
+            for n, deaminase_strand, start, stop in codons[codon]:
+                # PAMs matching each 3-mer of the deaminase window, every 3-mer being matched once against the PAMs
+                for site in range(i + start, min(i + stop, last_site) + 1):
+                    trimer = string[site:site+3]
+                    site_pams = pam_table.get(trimer)
+                    if site_pams is None:
+                        site_pams = pam_table[trimer] = [pam for pam, pattern in finder["pams"] if pattern.fullmatch(trimer)]
+                    for pam in site_pams:
+                        results[n].append({"index": i,
+                                           "CI_index": len(string) - i,
+                                           "target": codon,
+                                           "pam": pam,
+                                           "sequence": string[i:site+3],
+                                           "deaminase_strand": deaminase_strand})
+    return [sequence for target_results in results for sequence in target_results]
+
 def step_off_target(off_targets, target, string, last_index, min_concordance, max_mismatches, max_gaps, concordance = 0, mismatches = 0, gaps = 0, result = ""):
-    if len(string) == 0 or len(target) == 0:
-        if concordance >= min_concordance and result[0] != "*" and result[0] != "-":
-            off_targets.append({"index": [last_index-len(result), last_index],
-                                "concordance": concordance,
-                                "sequence": result,
-                                "mismatches": mismatches,
-                                "gaps": gaps})
-        return
-    
-    if target[-1] == string[-1]:
-        step_off_target(off_targets, target[:-1], string[:-1], last_index, min_concordance, max_mismatches, max_gaps, concordance + 1, mismatches, gaps, target[-1] + result)
-    else:
-        if mismatches < max_mismatches:
-            step_off_target(off_targets, target[:-1], string[:-1], last_index, min_concordance, max_mismatches, max_gaps, concordance, mismatches + 1, gaps, "*" + result)
-        if gaps < max_gaps:
-            step_off_target(off_targets, target, string[:-1], last_index, min_concordance, max_mismatches, max_gaps, concordance, mismatches, gaps + 1, "-" + result)
-        
-        if concordance >= min_concordance and result[0] != "*" and result[0] != "-":
-            off_targets.append({"index": [last_index-len(result), last_index],
+    """Align a target with the end of a genome string, from right to left, and record the off-targets.
+
+    Each mismatching nucleotide either stops the alignment or is skipped as a mismatch ("*") or as
+    a gap in the target ("-"). The alternatives are explored depth first with an explicit stack, the
+    alignment string being only built for the recorded off-targets. The remaining target length,
+    mismatches and gaps define the state of an alignment: the states which did not lead to any
+    off-target are not explored again.
+
+    Args:
+        off_targets (list): list in which the off-targets are recorded
+        target (str): target sequence
+        string (str): genome sequence preceding the PAM
+        last_index (int): index of the PAM in the genome sequence
+        min_concordance (int): threshold of concordance for a sequence to be considered as an off-target
+        max_mismatches (int): number of mismatches allowed in an off-target
+        max_gaps (int): number of gaps allowed in an off-target
+        concordance (int): concordance of the already aligned nucleotides
+        mismatches (int): number of mismatches in the already aligned nucleotides
+        gaps (int): number of gaps in the already aligned nucleotides
+        result (str): alignment string of the already aligned nucleotides
+    """
+    # Each frame holds the remaining target and string lengths, the alignment state, the events
+    # (mismatches and gaps) as a linked list and the action of the frame
+    EXTEND, RECORD, LEAVE = 0, 1, 2
+    stack = [(len(target), len(string), concordance, mismatches, gaps, None, EXTEND)]
+    dead_states = set()
+    while stack:
+        t, s, concordance, mismatches, gaps, events, action = stack.pop()
+
+        if action == LEAVE:
+            # No off-target was recorded since the state was entered
+            if len(off_targets) == events:
+                dead_states.add((t, mismatches, gaps))
+            continue
+
+        if action == EXTEND:
+            # The remaining nucleotides cannot reach the concordance threshold
+            if concordance + (t if t < s else s) < min_concordance:
+                continue
+            if dead_states and (t, mismatches, gaps) in dead_states:
+                continue
+            entry_t = t
+            entry_s = s
+            entry_concordance = concordance
+
+            while t > 0 and s > 0 and target[t-1] == string[s-1]:
+                t -= 1
+                s -= 1
+                concordance += 1
+
+            if t > 0 and s > 0:
+                if events is not None and (gaps < max_gaps or mismatches < max_mismatches):
+                    stack.append((entry_t, entry_s, entry_concordance, mismatches, gaps, len(off_targets), LEAVE))
+                if concordance >= min_concordance:
+                    stack.append((t, s, concordance, mismatches, gaps, events, RECORD))
+                if gaps < max_gaps:
+                    stack.append((t, s - 1, concordance, mismatches, gaps + 1, ("-", t, events), EXTEND))
+                if mismatches < max_mismatches:
+                    stack.append((t - 1, s - 1, concordance, mismatches + 1, gaps, ("*", t, events), EXTEND))
+                continue
+
+            if concordance < min_concordance:
+                continue
+
+        # Build the alignment string from the leftmost event
+        parts = []
+        end = t
+        while events is not None:
+            event, event_t, events = events
+            parts.append(target[end:event_t - 1 if event == "*" else event_t])
+            parts.append(event)
+            end = event_t
+        parts.append(target[end:])
+        alignment = "".join(parts) + result
+
+        if alignment[:1] != "*" and alignment[:1] != "-":
+            off_targets.append({"index": [last_index-len(alignment), last_index],
                                 "concordance": concordance,
-                                "sequence": result,
+                                "sequence": alignment,
                                 "mismatches": mismatches,
                                 "gaps": gaps})
 
-def check_off_target(sequence: dict, genome: str, concordance_threshold: int, allowed_mismatches: int, allowed_gaps: int):
-    """Check if the sequence has off-targets in the genome sequence.
+# Nucleotides matched by the ambiguous IUPAC codes of a PAM, N matching any character
+PAM_CODES = {"R": "AG", "Y": "CT", "S": "CG", "W": "AT", "K": "GT", "M": "AC", "B": "CGT", "D": "AGT", "H": "ACT", "V": "ACG"}
+
+def get_pam_pattern(pam: str):
+    """Compile a PAM sequence into a regular expression.
+
+    Args:
+        pam (str): PAM sequence, N representing any nucleotide and R, Y, S, W, K, M, B, D, H, V the IUPAC ambiguous nucleotides
+
+    Returns:
+        re.Pattern: pattern matching the PAM
+    """
+    return re.compile("".join("." if nucleotide == "N" else f"[{PAM_CODES[nucleotide]}]" if nucleotide in PAM_CODES else re.escape(nucleotide) for nucleotide in pam), re.DOTALL)
+
+def find_pam_sites(genome: str, pam: str, codes = None):
+    """Find every position of a PAM in a circularized genome sequence.
+
+    Args:
+        genome (str): genome sequence extended with its first two nucleotides
+        pam (str): PAM sequence, see get_pam_pattern
+        codes (numpy.ndarray): codes of the genome nucleotides to scan the PAM with numpy, see get_sequence_codes
+
+    Returns:
+        list: sorted indexes of the PAM sites in the genome sequence
+    """
+    if codes is not None and all(nucleotide in "ACGTN" or nucleotide in PAM_CODES for nucleotide in pam):
+        size = len(codes)
+        codes = np.concatenate([codes, codes[:len(pam)-1]])
+        match = np.ones(size, dtype=bool)
+        for k, nucleotide in enumerate(pam):
+            if nucleotide != "N":
+                match &= np.isin(codes[k:k+size], ["ACGT".index(base) for base in PAM_CODES.get(nucleotide, nucleotide)])
+        return np.flatnonzero(match).tolist()
+
+    return [match.start() for match in re.finditer(f"(?={get_pam_pattern(pam).pattern})", genome, re.DOTALL)]
+
+@lru_cache(maxsize=None)
+def get_seed_blocks(concordance_threshold: int, allowed_mismatches: int, allowed_gaps: int):
+    """Split the nucleotides next to the PAM into seed blocks.
+
+    An off-target has at least concordance_threshold matching nucleotides, all of them within
+    the concordance_threshold nucleotides preceding the PAM on the candidate side. Splitting
+    these nucleotides into one more block than the number of allowed mismatches and gaps
+    ensures, by the pigeonhole principle, that one of the blocks matches the genome exactly.
 
     Args:
-        sequence (dict): sequence dict
-        genome (str): genome sequence
         concordance_threshold (int): threshold of concordance for a sequence to be considered as an off-target
-    
+        allowed_mismatches (int): number of mismatches allowed in an off-target
+        allowed_gaps (int): number of gaps allowed in an off-target
+
     Returns:
-        list: list of off-targets index in the genome sequence
+        list: distance to the PAM of the farthest nucleotide and length of each block
     """
-    # Support for the circularity of the genome sequence
-    genome = (genome + genome[:2]).upper()
+    nb_blocks = allowed_mismatches + allowed_gaps + 1
+    if concordance_threshold < nb_blocks:
+        return []
 
-    sequence_length = len(sequence["sequence"])
-    off_targets = []
-    for i in range(len(genome)-2):
-        for k in range(3):
-            if sequence["pam"][k] == "N":
-                continue
-            if genome[i+k] != sequence["pam"][k]:
-                break
-            if k == 2:
-                start = i - sequence_length + 3
-                if start >= 0:
-                    gen_seq = genome[start:i]
+    blocks = []
+    distance = 0
+    for i in range(nb_blocks):
+        length = concordance_threshold // nb_blocks + (1 if i < concordance_threshold % nb_blocks else 0)
+        distance += length
+        blocks.append((distance, length))
+    return blocks
+
+def get_seed_length(concordance_threshold: int, allowed_mismatches: int, allowed_gaps: int):
+    """Get the length of the seeds to index for the given off-target parameters.
+
+    Args:
+        concordance_threshold (int): threshold of concordance for a sequence to be considered as an off-target
+        allowed_mismatches (int): number of mismatches allowed in an off-target
+        allowed_gaps (int): number of gaps allowed in an off-target
+
+    Returns:
+        int: seed length, 0 if the off-targets cannot be seeded
+    """
+    blocks = get_seed_blocks(concordance_threshold, allowed_mismatches, allowed_gaps)
+    if len(blocks) == 0:
+        return 0
+    return min(min(length for _, length in blocks), max_seed_length)
+
+def encode_seed(seed: str):
+    """Encode a seed of nucleotides into an integer, 2 bits per nucleotide.
+
+    Args:
+        seed (str): seed sequence
+
+    Returns:
+        int: code of the seed, None if the seed contains other nucleotides than A, C, G and T
+    """
+    code = 0
+    for nucleotide in seed:
+        value = "ACGT".find(nucleotide)
+        if value < 0:
+            return None
+        code = code * 4 + value
+    return code
+
+def get_site_typecode(size: int):
+    """Get the typecode of the arrays of genome positions, 4 bytes per position unless the genome is longer than 2**32 nucleotides.
+
+    Args:
+        size (int): length of the genome
+
+    Returns:
+        str: typecode of the arrays
+    """
+    return "I" if size + 2 < 2**32 else "q"
+
+def build_seed_table(genome: str, seed_length: int, codes = None, circular: bool = True):
+    """Index the positions of every seed of a genome, sorted by seed code.
+
+    Args:
+        genome (str): genome sequence, not circularized
+        seed_length (int): length of the seeds
+        codes (numpy.ndarray): codes of the genome nucleotides to build the table with numpy, see get_sequence_codes
+        circular (bool): index the seeds overlapping the origin of a circular genome
+
+    Returns:
+        dict: seed length, start of each seed code in the positions and the sorted positions, see get_site_typecode
+    """
+    typecode = get_site_typecode(len(genome))
+    if codes is not None:
+        size = len(codes) if circular else max(len(codes) - seed_length + 1, 0)
+        codes = np.concatenate([codes, codes[:seed_length-1] if circular else np.full(seed_length-1, 4, dtype=codes.dtype)]).astype(np.int64)
+
+        # Seeds containing an unknown nucleotide are not indexed
+        unknown = np.concatenate([[0], np.cumsum(codes == 4)])
+        positions = np.flatnonzero(unknown[seed_length:seed_length+size] == unknown[:size])
+        seed_codes = np.zeros(len(positions), dtype=np.int64)
+        for k in range(seed_length):
+            seed_codes = seed_codes * 4 + codes[positions + k]
+
+        order = np.argsort(seed_codes, kind="stable")
+        offsets = array(typecode)
+        offsets.frombytes(np.concatenate([[0], np.cumsum(np.bincount(seed_codes, minlength=4**seed_length))]).astype(typecode).tobytes())
+        sorted_positions = array(typecode)
+        sorted_positions.frombytes(positions[order].astype(typecode).tobytes())
+        return {"length": seed_length, "offsets": offsets, "positions": sorted_positions}
+
+    if circular:
+        genome = genome + genome[:seed_length-1]
+    size = max(len(genome) - seed_length + 1, 0)
+    mask = 4**(seed_length-1)
+
+    # Code of the seed starting at each position, -1 if it contains an unknown nucleotide
+    codes = array("l", bytes(array("l").itemsize * size))
+    code = 0
+    valid = 0
+    for i, nucleotide in enumerate(genome):
+        value = "ACGT".find(nucleotide)
+        if value < 0:
+            valid = 0
+            code = 0
+        else:
+            valid += 1
+            code = (code % mask) * 4 + value
+        if i >= seed_length - 1:
+            codes[i-seed_length+1] = code if valid >= seed_length else -1
+
+    # Counting sort of the positions by seed code
+    offsets = array(typecode, bytes(array(typecode).itemsize * (4**seed_length + 1)))
+    for code in codes:
+        if code >= 0:
+            offsets[code+1] += 1
+    for code in range(4**seed_length):
+        offsets[code+1] += offsets[code]
+    positions = array(typecode, bytes(array(typecode).itemsize * offsets[-1]))
+    filled = offsets[:-1]
+    for i, code in enumerate(codes):
+        if code >= 0:
+            positions[filled[code]] = i
+            filled[code] += 1
+
+    return {"length": seed_length, "offsets": offsets, "positions": positions}
+
+def index_genome_strand(genome, pams: list, seed_length: int = 0, circular: bool = True):
+    """Index the PAM sites and the seeds of one strand of a genome.
+
+    Args:
+        genome (str or dict): genome sequence or encoded genome sequence, see encode_sequence
+        pams (list): list of PAM sequences
+        seed_length (int): length of the seeds to index, no seed table is built if 0
+        circular (bool): the genome is circular
+
+    Returns:
+        dict: circularized genome sequence, topology, PAM sites of each PAM and seed table, the encoded sequence being packed again
+        with encode_sequence to be shared or cached, see pack_reference_index
+    """
+    if isinstance(genome, str):
+        genome = encode_sequence(genome)
+    codes = get_sequence_codes(genome) if np is not None else None
+
+    # Support for the circularity of the genome sequence, the PAM sites overlapping the origin of a linear genome are discarded
+    sequence = decode_sequence(genome)
+    sequence += sequence[:2]
+    pam_sites = {}
+    for pam in pams:
+        sites = find_pam_sites(sequence, pam, codes)
+        if not circular:
+            sites = [site for site in sites if site <= genome["length"] - len(pam)]
+        pam_sites[pam] = array(get_site_typecode(genome["length"]), sites)
+
+    return {"sequence": sequence,
+            "circular": circular,
+            "pam_sites": pam_sites,
+            "seeds": build_seed_table(sequence[:-2], seed_length, codes, circular) if seed_length > 0 else None}
+
+def build_genome_index(genome: str, pams: list, seed_length: int = 0, circular: bool = True):
+    """Index the PAM sites and the seeds of a genome sequence on both strands, once for all the candidates.
+
+    Args:
+        genome (str): genome sequence
+        pams (list): list of PAM sequences
+        seed_length (int): length of the seeds to index, no seed table is built if 0
+        circular (bool): the genome sequence is circular
+
+    Returns:
+        dict: size and topology of the genome and index of the coding and complementary strands
+    """
+    encoded = encode_sequence(genome)
+    return {"size": len(genome),
+            "pams": list(pams),
+            "circular": circular,
+            "coding": index_genome_strand(encoded, pams, seed_length, circular),
+            "complementary": index_genome_strand(get_CI_encoded(encoded), pams, seed_length, circular)}
+
+def build_reference_index(contigs: list, pams: list, seed_length: int = 0):
+    """Index every contig of a reference genome (chromosomes, plasmids...).
+
+    Args:
+        contigs (list): list of contig dicts, see read_genome
+        pams (list): list of PAM sequences
+        seed_length (int): length of the seeds to index, no seed table is built if 0
+
+    Returns:
+        dict: PAM sequences and genome index of each contig with its name, see build_genome_index
+    """
+    return {"pams": list(pams),
+            "contigs": [dict(build_genome_index(contig["sequence"], pams, seed_length, contig["circular"]), name=contig["name"]) for contig in contigs]}
+
+# Extensions of the FASTA files of the entries and of the genomes
+FASTA_EXTENSIONS = (".fasta", ".fasta.gz")
+GENOME_EXTENSIONS = (".fa", ".fa.gz")
+
+# Format of the genome index files, to be increased when the format of the index changes
+INDEX_MAGIC = b"DTI-INDEX"
+INDEX_VERSION = 4
+INDEX_EXTENSION = f".v{INDEX_VERSION}.idx"
+
+def pack_reference_index(reference_index: dict):
+    """Pack a reference index into a flat buffer: the 2 bits encoded sequences with their exceptions, the PAM sites and the seed tables of both strands of each contig.
+
+    Args:
+        reference_index (dict): reference index, see build_reference_index
+
+    Returns:
+        dict: layout of the buffer, with the offset and length of each array
+        bytearray: buffer
+    """
+    buffer = bytearray()
+    layout = {"pams": reference_index["pams"], "contigs": []}
+    for genome_index in reference_index["contigs"]:
+        contig_layout = {"name": genome_index["name"], "size": genome_index["size"], "circular": genome_index["circular"]}
+        for strand in ("coding", "complementary"):
+            strand_index = genome_index[strand]
+            encoded = encode_sequence(strand_index["sequence"][:-2])
+            typecode = get_site_typecode(encoded["length"])
+            strand_layout = {"length": encoded["length"], "typecode": typecode, "pam_sites": {}}
+            arrays = [("packed", None, encoded["packed"]), ("exceptions", None, array("q", [value for exception in encoded["exceptions"] for value in exception]))]
+            arrays += [("pam_sites", pam, sites) for pam, sites in strand_index["pam_sites"].items()]
+            if strand_index["seeds"] is not None:
+                strand_layout["seed_length"] = strand_index["seeds"]["length"]
+                arrays += [("offsets", None, strand_index["seeds"]["offsets"]), ("positions", None, strand_index["seeds"]["positions"])]
+
+            for key, pam, data in arrays:
+                data = bytes(data) if key == "packed" else data.tobytes()
+
+                # Keep the arrays aligned on the largest item size
+                buffer += bytes(-len(buffer) % array("q").itemsize)
+                if pam is None:
+                    strand_layout[key] = (len(buffer), len(data))
                 else:
-                    gen_seq = genome[start-2: -2] + genome[:i]
-                step_off_target(off_targets, sequence["sequence"][:-3], gen_seq, i, concordance_threshold, allowed_mismatches, allowed_gaps, result=genome[i:i+3])
+                    strand_layout[key][pam] = (len(buffer), len(data))
+                buffer += data
+            contig_layout[strand] = strand_layout
+        layout["contigs"].append(contig_layout)
 
-    return off_targets
+    return layout, buffer
 
-def analyse_fasta_file(dir_path: str, fasta_file: str, genome_file: str, save: bool, targets: list, pams: list, deaminase_window: list, concordance_threshold: int, allowed_mismatches: int, nb_processes: int = 1):
-    """Analyse a fasta file to find the possible sequences, excluding the off-targets.
+def unpack_reference_index(layout: dict, buffer):
+    """Unpack a reference index from a flat buffer, without copying the PAM sites and the seed tables.
 
     Args:
-        dir_path (str): directory path
-        fasta_file (str): fasta file name
-        genome_file (str): genome file name
-        save (bool): save the results in a file, if False the results are printed in the console
-        targets (list): list of target codons with the index of the target nucleotide in the codon
+        layout (dict): layout of the buffer, see pack_reference_index
+        buffer (memoryview): buffer
+
+    Returns:
+        dict: reference index, see build_reference_index
+    """
+    reference_index = {"pams": list(layout["pams"]), "contigs": []}
+    for contig_layout in layout["contigs"]:
+        genome_index = {"size": contig_layout["size"], "pams": reference_index["pams"], "circular": contig_layout["circular"], "name": contig_layout["name"]}
+        for strand in ("coding", "complementary"):
+            strand_layout = contig_layout[strand]
+            # The sequences are decoded from the buffer, the exceptions being stored as their index, length and character code
+            start, length = strand_layout["packed"]
+            exceptions = buffer[strand_layout["exceptions"][0]:sum(strand_layout["exceptions"])].cast("q")
+            sequence = decode_sequence({"length": strand_layout["length"], "packed": buffer[start:start+length], "exceptions": zip(exceptions[0::3], exceptions[1::3], exceptions[2::3])})
+            typecode = strand_layout["typecode"]
+            genome_index[strand] = {"sequence": sequence + sequence[:2],
+                                    "circular": contig_layout["circular"],
+                                    "pam_sites": {pam: buffer[start:start+length].cast(typecode) for pam, (start, length) in strand_layout["pam_sites"].items()},
+                                    "seeds": None}
+            if "seed_length" in strand_layout:
+                genome_index[strand]["seeds"] = {"length": strand_layout["seed_length"],
+                                                 "offsets": buffer[strand_layout["offsets"][0]:sum(strand_layout["offsets"])].cast(typecode),
+                                                 "positions": buffer[strand_layout["positions"][0]:sum(strand_layout["positions"])].cast(typecode)}
+        reference_index["contigs"].append(genome_index)
+    return reference_index
+
+def pack_index_header(layout: dict):
+    """Pack the layout of a reference index into the header preceding its buffer, the buffer staying aligned.
+
+    Args:
+        layout (dict): layout of the buffer, see pack_reference_index
+
+    Returns:
+        bytes: header, with the magic bytes and the length of the layout
+    """
+    header = json.dumps(layout).encode()
+    header += b" " * (-(len(INDEX_MAGIC) + 8 + len(header)) % array("q").itemsize)
+    return INDEX_MAGIC + len(header).to_bytes(8, "little") + header
+
+def share_reference_index(reference_index: dict):
+    """Copy a reference index and its layout into a shared memory block, to be attached by the worker processes.
+
+    Args:
+        reference_index (dict): reference index, see build_reference_index
+
+    Returns:
+        SharedMemory: shared memory block, to be unlinked once the workers are done
+        dict: name of the block, the only description of the reference index sent with the tasks
+    """
+    layout, buffer = pack_reference_index(reference_index)
+    header = pack_index_header(layout)
+    shared_memory = SharedMemory(create=True, size=len(header) + len(buffer))
+    shared_memory.buf[:len(header)] = header
+    shared_memory.buf[len(header):len(header) + len(buffer)] = buffer
+    return shared_memory, {"name": shared_memory.name}
+
+def attach_reference_index(shared_index: dict):
+    """Attach a reference index shared by share_reference_index, without copying the PAM sites and the seed tables.
+
+    Each process decodes its own copy of both strands of every contig, the search running on strings:
+    the attached index holds about 2 bytes per nucleotide of the genome in the process.
+
+    Args:
+        shared_index (dict): description of the shared memory block
+
+    Returns:
+        dict: reference index, see build_reference_index
+        SharedMemory: attached shared memory block, to be closed once the reference index is released
+    """
+    shared_memory = SharedMemory(name=shared_index["name"])
+    start = len(INDEX_MAGIC) + 8
+    header_length = int.from_bytes(shared_memory.buf[len(INDEX_MAGIC):start], "little")
+    layout = json.loads(bytes(shared_memory.buf[start:start + header_length]))
+    return unpack_reference_index(layout, shared_memory.buf[start + header_length:]), shared_memory
+
+def get_genome_key(contigs: list):
+    """Get a key identifying the content of a genome, its contigs and their topology.
+
+    Args:
+        contigs (list): list of contig dicts, see read_genome
+
+    Returns:
+        str: key of the genome
+    """
+    key = hashlib.sha256()
+    for contig in contigs:
+        key.update(json.dumps([contig["name"], contig["circular"], len(contig["sequence"])]).encode())
+        key.update(contig["sequence"].encode("ascii", "replace"))
+    return key.hexdigest()
+
+def get_reference_key(genome_key: str, pams: list, seed_length: int):
+    """Get the key of a reference index in the cache, from the key of the genome and the indexing parameters.
+
+    Args:
+        genome_key (str): key of the genome, see get_genome_key
         pams (list): list of PAM sequences
-        deaminase_window (list): upper and lower bounds of the deaminase window
-        concordance_threshold (int): threshold of concordance for a sequence to be considered as an off-target
+        seed_length (int): length of the seeds indexed
+
+    Returns:
+        str: key of the reference index
     """
-    # Open the fasta file
-    file_f = open(os.path.join(dir_path, fasta_file), "r")
-    fasta = file_f.read()
-    fasta = fasta.split("\n")
-    file_f.close()
-
-    # Open the genome file and format it
-    file_g = open(os.path.join(dir_path, genome_file), "r")
-    genome = file_g.read()
-    genome = "".join(genome.split("\n")[1:])
-    CI_genome = get_CI_sequence(genome)
-    file_g.close()
-
-    # Queues for the multiprocessing
-    inputs = Queue()
-    for i in range(len(fasta)//2):
-        inputs.put((i, fasta[i*2], fasta[i*2+1], genome, CI_genome, targets, pams, deaminase_window, concordance_threshold, allowed_mismatches))
-    outputs = Queue()
-
-    # Start processes
-    for i in range(nb_processes):
-        Process(target=worker, args=(inputs, outputs)).start()
-
-    # Process the FASTA entries
-    buffers = ["" for _ in range(len(fasta)//2)]
-    nb_KO = 0
-    nb_targets = 0
-    for i in tqdm(range(len(fasta)//2)):
-        id, entry_targets, entry_buffer = outputs.get()
-        buffers[id] = entry_buffer
-        nb_targets += entry_targets
-        if entry_targets > 0:
-            nb_KO += 1
+    return hashlib.sha256(json.dumps([INDEX_VERSION, genome_key, list(pams), seed_length]).encode()).hexdigest()
 
-    # Write the output
-    result = f"Number of KO: {nb_KO}/{len(fasta)//2} - {round(nb_KO/(len(fasta)//2)*100, 2)}%\n"
-    result += f"Number of potential targets found among all genes: {nb_targets}\n\n"
-    result += "---------------------------------------------\n\n"
-    for str in buffers:
-        result += str
+def save_reference_index(reference_index: dict, path: str):
+    """Save a reference index in a file which can be memory-mapped.
 
-    # Printing or saving the results
-    if save:
-        filename = fasta_file[:-6]
-        output = open(dir_path + "/results_" + filename + ".txt", "w")
-        output.write(result)
-        output.close()
-    else:
-        print(result)
+    Args:
+        reference_index (dict): reference index, see build_reference_index
+        path (str): path of the file
+    """
+    layout, buffer = pack_reference_index(reference_index)
 
-    # Tell child processes to stop
-    for i in range(nb_processes):
-        inputs.put('STOP')
+    # Write in a temporary file first so that a concurrent run never reads a partial index
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(pack_index_header(layout))
+        file.write(buffer)
+    os.replace(temporary_path, path)
 
-def get_CI_sequence(sequence: str):
-    """Get the complementary inverse sequence of a DNA sequence.
+def read_reference_index(path: str):
+    """Read a reference index saved by save_reference_index, memory-mapping its arrays.
 
     Args:
-        sequence (str): DNA sequence
+        path (str): path of the file
 
     Returns:
-        str: complementary inverse DNA sequence
+        dict: reference index, None if the file is not a valid index of the current version
     """
-    complementary = ""
-    for nucleotide in sequence:
-        if nucleotide == "A":
-            complementary += "T"
-        elif nucleotide == "a":
-            complementary += "t"
-        elif nucleotide == "T":
-            complementary += "A"
-        elif nucleotide == "t":
-            complementary += "a"
-        elif nucleotide == "C":
-            complementary += "G"
-        elif nucleotide == "c":
-            complementary += "g"
-        elif nucleotide == "G":
-            complementary += "C"
-        elif nucleotide == "g":
-            complementary += "c"
-        elif nucleotide == "N":
-            complementary += "N"
-        elif nucleotide == "n":
-            complementary += "n"
-        else:
-            complementary += nucleotide
-    return complementary[::-1]
+    with open(path, "rb") as file:
+        if file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            return None
+        header_length = int.from_bytes(file.read(8), "little")
+        try:
+            layout = json.loads(file.read(header_length))
+        except ValueError:
+            return None
+        try:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
 
-def worker(input, output):
-    for args in iter(input.get, 'STOP'):
-        result = process_entry(*args)
-        output.put(result)
+    return unpack_reference_index(layout, memoryview(mapping)[len(INDEX_MAGIC) + 8 + header_length:])
 
-def process_entry(id, entry_name, sample, genome, CI_genome, targets, pams, deaminase_window, concordance_threshold, allowed_mismatches):
-    buffer = entry_name + "\n\n"
+def load_reference_index(contigs: list, pams: list, seed_length: int = 0, cache_directory: str = None, cache_size: int = 0, genome_key: str = None):
+    """Load a reference index from the cache, or build it and store it in the cache.
 
-    sequences = []
-    for target in targets:
-        if target[2] == "complementary":
-            CI_sample = get_CI_sequence(sample)
-            CI_target = get_CI_sequence(target[0])
-            sequences += find_sequences(CI_sample, CI_target, 2 - target[1], target[2], pams, deaminase_window)
-        else:
-            sequences += find_sequences(sample, target[0], target[1], target[2], pams, deaminase_window)
+    The cache keeps the most recently used indexes within cache_size bytes, the indexes of the other versions of the format being removed.
 
-    buffer += f"Number of potential targets found: {len(sequences)}\n\n"
-    size_genome = len(genome)
+    Args:
+        contigs (list): list of contig dicts, see read_genome
+        pams (list): list of PAM sequences
+        seed_length (int): length of the seeds to index, no seed table is built if 0
+        cache_directory (str): directory of the cache, the index is built without cache if None
+        cache_size (int): maximal size of the cache in bytes, unbounded if 0
+        genome_key (str): key of the genome if already computed, see get_genome_key
 
-    for j, sequence in enumerate(sequences):
-        buffer += f"Target {j+1} on {sequence['deaminase_strand']} strand:\n"
+    Returns:
+        dict: reference index, see build_reference_index
+    """
+    if cache_directory is None:
+        return build_reference_index(contigs, pams, seed_length)
 
-        if sequence["deaminase_strand"] == "coding":
-            buffer += f"    Sequence {j+1}: {sequence['sequence']}\n"
-            buffer += f"    PAM: {sequence['pam']}\n"
-            buffer += f"    Target: {sequence['target']}\n"
-            buffer += f"    Index in FASTA sample: {sequence['index']}\n\n"
-        else:
-            buffer += f"    Sequence {j+1}: {get_CI_sequence(sequence['sequence'])} ({sequence['sequence']})\n"
-            buffer += f"    PAM: {get_CI_sequence(sequence['pam'])} ({sequence['pam']})\n"
-            buffer += f"    Target: {get_CI_sequence(sequence['target'])} ({sequence['target']})\n"
-            buffer += f"    Index in FASTA sample: {sequence['CI_index']} ({sequence['index']})\n\n"
+    os.makedirs(cache_directory, exist_ok=True)
+    if genome_key is None:
+        genome_key = get_genome_key(contigs)
+    path = os.path.join(cache_directory, get_reference_key(genome_key, pams, seed_length) + INDEX_EXTENSION)
+    if os.path.exists(path):
+        reference_index = read_reference_index(path)
+        if reference_index is not None:
+            os.utime(path)
+            return reference_index
 
-        off_targets = check_off_target(sequence, genome, concordance_threshold, allowed_mismatches, allowed_gaps)
-        replicas = []
-        for off_target in off_targets[:]:
-            if off_target["sequence"] == sequence["sequence"]:
-                replicas.append(off_target)
-                off_targets.remove(off_target)
+    reference_index = build_reference_index(contigs, pams, seed_length)
+    save_reference_index(reference_index, path)
 
-        CI_off_targets = check_off_target(sequence, CI_genome, concordance_threshold, allowed_mismatches, allowed_gaps)
-        CI_replicas = []
-        for CI_off_target in CI_off_targets[:]:
-            if CI_off_target["sequence"] == sequence["sequence"]:
-                CI_replicas.append(CI_off_target)
-                CI_off_targets.remove(CI_off_target)
+    # Remove the indexes of the other versions of the format, then evict the least recently used indexes
+    files = []
+    for file in os.listdir(cache_directory):
+        if not file.endswith(".idx"):
+            continue
+        file = os.path.join(cache_directory, file)
+        if file.endswith(INDEX_EXTENSION):
+            files.append(file)
+            continue
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
+    if cache_size > 0:
+        files.sort(key=os.path.getmtime, reverse=True)
+        total = 0
+        for file in files:
+            total += os.path.getsize(file)
+            if total > cache_size and file != path:
+                os.remove(file)
 
-        buffer += f"    Number of exact replica: {len(replicas) + len(CI_replicas)}\n\n"
-        for replica in replicas:
-            buffer += f"        Index in genome coding strand: {replica['index'][0]} to {replica['index'][1]}\n"
-        for CI_replica in CI_replicas:
-            buffer += f"        Index in genome complementary strand: {size_genome - CI_replica['index'][0]} to {size_genome - CI_replica['index'][1]}\n"
-        buffer += "\n"
-        
-        buffer += f"    Number of off-targets: {len(off_targets) + len(CI_off_targets)}\n\n"
-        for off_target in off_targets:
-            buffer += f"        Off-target sequence: {off_target['sequence']}\n"
-            buffer += f"        Concordance: {off_target['concordance']}\n"
-            buffer += f"        Index in genome coding strand: {off_target['index'][0]} to {off_target['index'][1]}\n\n"
-        for CI_off_target in CI_off_targets:
-            buffer += f"        Off-target sequence: {CI_off_target['sequence']}\n"
-            buffer += f"        Concordance: {CI_off_target['concordance']}\n"
-            buffer += f"        Index in genome complementary strand: {size_genome - CI_off_target['index'][0]} to {size_genome - CI_off_target['index'][1]}\n\n"
+    return reference_index
 
-    buffer += "---------------------------------------------\n\n"
+# Format of the cached off-targets, to be increased when the off-target records change
+OFF_TARGET_CACHE_VERSION = 1
 
-    return id, len(sequences), buffer
+def get_candidate_key(sequence: dict):
+    """Get the key of a candidate, the candidates with the same key having the same off-targets.
 
-if __name__ == "__main__":
+    Args:
+        sequence (dict): sequence dict
 
-    for dir in os.listdir("data/"):
-        dir_path = os.path.join("data", dir)
-        
-        if os.path.isdir(dir_path):
-            results_files = [file for file in os.listdir(dir_path) if file.startswith("results_")]
-            fasta_files = [file for file in os.listdir(dir_path) if file.endswith(".fasta")]
-            genome_files = [file for file in os.listdir(dir_path) if file.endswith(".fa")]
-            
-            # Repository already analysed
-            if len(results_files) == 1:
-                continue
+    Returns:
+        tuple: sequence and PAM of the candidate
+    """
+    return sequence["sequence"], sequence["pam"]
 
-            # Check if the repository is correctly formatted
-            if len(fasta_files) != 1 or len(genome_files) != 1:
-                print(f"The repository {dir_path} should contain exactly one .fasta file and one .fa file !")
-                break
+def open_off_target_cache(path: str, genome_key: str, parameters: dict, cache_size: int = 0):
+    """Open the cache of the off-targets found in the previous runs, for a genome and the search parameters.
+
+    Args:
+        path (str): path of the cache database
+        genome_key (str): key of the genome, see get_genome_key
+        parameters (dict): identification parameters
+        cache_size (int): maximal size of the cached off-targets in bytes, unbounded if 0
+
+    Returns:
+        dict: connection to the database, prefix of the keys of this genome and parameters and maximal size
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    connection = sqlite3.connect(path, timeout=60)
+    connection.execute("CREATE TABLE IF NOT EXISTS off_targets (key TEXT PRIMARY KEY, value TEXT, size INTEGER, used REAL)")
+    prefix = json.dumps([OFF_TARGET_CACHE_VERSION, genome_key, parameters["concordance_threshold"], parameters["allowed_mismatches"], parameters["allowed_gaps"]])
+    return {"connection": connection, "prefix": prefix, "size": cache_size}
+
+def get_cached_off_targets(cache: dict, candidate_key: tuple):
+    """Get the off-targets of a candidate from the cache.
+
+    Args:
+        cache (dict): off-target cache, see open_off_target_cache
+        candidate_key (tuple): key of the candidate, see get_candidate_key
+
+    Returns:
+        tuple: off-targets on the coding and the complementary strands, None if the candidate is not cached
+    """
+    key = cache["prefix"] + json.dumps(candidate_key)
+    row = cache["connection"].execute("SELECT value FROM off_targets WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    cache["connection"].execute("UPDATE off_targets SET used = ? WHERE key = ?", (time.time(), key))
+    off_targets, CI_off_targets = json.loads(row[0])
+    return off_targets, CI_off_targets
+
+def store_off_targets(cache: dict, results: dict, max_off_targets: int = None):
+    """Store the off-targets of candidates in the cache, evicting the least recently used ones beyond the size of the cache.
+
+    Args:
+        cache (dict): off-target cache, see open_off_target_cache
+        results (dict): off-targets on the coding and the complementary strands of each candidate key
+        max_off_targets (int): limit of the search in screening mode, the candidates over it being incomplete and not stored, see get_search_limit
+    """
+    connection = cache["connection"]
+    now = time.time()
+    rows = []
+    for candidate_key, off_targets in results.items():
+        if max_off_targets is not None and len(off_targets[0]) + len(off_targets[1]) > max_off_targets:
+            continue
+        value = json.dumps(off_targets)
+        rows.append((cache["prefix"] + json.dumps(candidate_key), value, len(value), now))
+    connection.executemany("INSERT OR REPLACE INTO off_targets VALUES (?, ?, ?, ?)", rows)
 
-            print(f"Analyzing {dir}...")
-            t_start = time.time()
-            analyse_fasta_file(dir_path, fasta_files[0], genome_files[0], True, targets, pams, deaminase_window, concordance_threshold, allowed_mismatches, nb_processes)
-            t_end = time.time()
-            print(f"{dir} analysed !")
-            print(f"Time taken: {round(t_end-t_start, 2)} seconds")
\ No newline at end of file
+    if cache["size"] > 0:
+        total = 0
+        evicted = []
+        for key, size in connection.execute("SELECT key, size FROM off_targets ORDER BY used DESC"):
+            total += size
+            if total > cache["size"]:
+                evicted.append((key,))
+        connection.executemany("DELETE FROM off_targets WHERE key = ?", evicted)
+    connection.commit()
+
+def close_off_target_cache(cache: dict):
+    """Close the cache of the off-targets, saving the use of the cached candidates.
+
+    Args:
+        cache (dict): off-target cache, see open_off_target_cache
+    """
+    cache["connection"].commit()
+    cache["connection"].close()
+
+# Format of the checkpoints, to be increased when the records of the entries change
+CHECKPOINT_VERSION = 1
+
+def get_checkpoint_name(fasta_file: str):
+    """Get the name of the checkpoint file of a FASTA file, hidden and not starting with results_.
+
+    Args:
+        fasta_file (str): fasta file name, possibly gzipped
+
+    Returns:
+        str: checkpoint file name
+    """
+    return "." + get_result_name(fasta_file, "checkpoint")[len("results_"):]
+
+def open_checkpoint(path: str, genome_key: str, parameters: dict):
+    """Open the checkpoint of an analysis, where the results of each entry are saved once written.
+
+    Args:
+        path (str): path of the checkpoint database
+        genome_key (str): key of the genome, see get_genome_key
+        parameters (dict): identification parameters
+
+    Returns:
+        dict: connection to the database, key of the run parameters and keys of the entries of this run, an unreadable database being discarded
+    """
+    connection = sqlite3.connect(path, timeout=60)
+    try:
+        connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT)")
+    except sqlite3.OperationalError:
+        connection.close()
+        raise
+    except sqlite3.DatabaseError:
+        # Unreadable checkpoint, for instance truncated when a run was killed, discarded and the entries analysed again
+        connection.close()
+        os.remove(path)
+        connection = sqlite3.connect(path, timeout=60)
+        connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT)")
+    run_key = json.dumps([CHECKPOINT_VERSION, genome_key, parameters["targets"], parameters["pams"], parameters["deaminase_window"],
+                          parameters["concordance_threshold"], parameters["allowed_mismatches"], parameters["allowed_gaps"], parameters.get("off_target_budget")])
+    return {"connection": connection, "run_key": hashlib.sha256(run_key.encode()).hexdigest(), "keys": set()}
+
+def get_entry_key(checkpoint: dict, sample: str):
+    """Get the key of a FASTA entry in the checkpoint, from its sequence and the run parameters.
+
+    Args:
+        checkpoint (dict): checkpoint of the analysis, see open_checkpoint
+        sample (str): sequence of nucleotides of the entry
+
+    Returns:
+        str: key of the entry
+    """
+    key = hashlib.sha256(checkpoint["run_key"].encode())
+    key.update(sample.encode("utf-8", "replace"))
+    return key.hexdigest()
+
+def get_checkpoint_entry(checkpoint: dict, entry_key: str):
+    """Get the results of an entry saved in the checkpoint.
+
+    Args:
+        checkpoint (dict): checkpoint of the analysis, see open_checkpoint
+        entry_key (str): key of the entry, see get_entry_key
+
+    Returns:
+        dict: possible sequences of the entry and their off-targets on both strands, None if the entry is not saved
+    """
+    checkpoint["keys"].add(entry_key)
+    row = checkpoint["connection"].execute("SELECT value FROM entries WHERE key = ?", (entry_key,)).fetchone()
+    return json.loads(row[0]) if row is not None else None
+
+def store_checkpoint_entry(checkpoint: dict, entry_key: str, sequences: list, off_targets: list, CI_off_targets: list):
+    """Save the results of an entry in the checkpoint.
+
+    Args:
+        checkpoint (dict): checkpoint of the analysis, see open_checkpoint
+        entry_key (str): key of the entry, see get_entry_key
+        sequences (list): list of the possible sequences
+        off_targets (list): off-targets of each sequence on the coding strand of the genome
+        CI_off_targets (list): off-targets of each sequence on the complementary strand of the genome
+    """
+    value = json.dumps({"sequences": sequences, "off_targets": off_targets, "CI_off_targets": CI_off_targets})
+    checkpoint["connection"].execute("INSERT OR REPLACE INTO entries VALUES (?, ?)", (entry_key, value))
+
+def close_checkpoint(checkpoint: dict, complete: bool):
+    """Close the checkpoint of an analysis, keeping only the entries of the last run once it is complete.
+
+    Args:
+        checkpoint (dict): checkpoint of the analysis, see open_checkpoint
+        complete (bool): the analysis is complete, the entries removed from the FASTA file or analysed with other parameters are removed
+    """
+    connection = checkpoint["connection"]
+    if complete:
+        removed = [(key,) for (key,) in connection.execute("SELECT key FROM entries") if key not in checkpoint["keys"]]
+        connection.executemany("DELETE FROM entries WHERE key = ?", removed)
+    connection.commit()
+    connection.close()
+
+def find_seed_sites(sequence: dict, strand: dict, concordance_threshold: int, allowed_mismatches: int, allowed_gaps: int, site_range: tuple = None):
+    """Find the PAM sites of a genome strand where an off-target of the sequence may lie, using its seed table.
+
+    Args:
+        sequence (dict): sequence dict
+        strand (dict): genome strand index, see index_genome_strand
+        concordance_threshold (int): threshold of concordance for a sequence to be considered as an off-target
+        allowed_mismatches (int): number of mismatches allowed in an off-target
+        allowed_gaps (int): number of gaps allowed in an off-target
+        site_range (tuple): start and stop of the PAM sites searched, only the seed hits which may lead to them being checked, see get_shard_ranges
+
+    Returns:
+        list: sorted PAM sites to extend, None if seeding is not possible or not worth it
+    """
+    seeds = strand["seeds"]
+    protospacer = sequence["sequence"][:-3]
+    blocks = get_seed_blocks(concordance_threshold, allowed_mismatches, allowed_gaps)
+    if seeds is None or len(blocks) == 0 or concordance_threshold > len(protospacer):
+        return None
+    if seeds["length"] > min(length for _, length in blocks):
+        return None
+
+    # Seed of each block, located by its distance to the PAM
+    hits = []
+    nb_hits = 0
+    for distance, _ in blocks:
+        code = encode_seed(protospacer[len(protospacer)-distance:len(protospacer)-distance+seeds["length"]])
+        if code is None:
+            return None
+        hits.append((distance, seeds["offsets"][code], seeds["offsets"][code+1]))
+        nb_hits += seeds["offsets"][code+1] - seeds["offsets"][code]
+
+    # Scanning every PAM site is cheaper than checking the seed hits
+    pam_sites = strand["pam_sites"].get(sequence["pam"])
+    if pam_sites is not None and nb_hits * (allowed_gaps + 1) >= len(pam_sites):
+        return None
+
+    # Each gap before the block shifts the PAM by one nucleotide
+    genome = strand["sequence"]
+    size = len(genome) - 2
+    pam_pattern = get_pam_pattern(sequence["pam"])
+    sites = set()
+    for distance, start, end in hits:
+        # The positions of a seed are sorted, only the hits before the shard and the ones wrapping around the origin to it are kept
+        hit_positions = [seeds["positions"][start:end]]
+        if site_range is not None:
+            hit_positions = [seeds["positions"][bisect_left(seeds["positions"], low, start, end):bisect_left(seeds["positions"], high, start, end)]
+                             for low, high in ((site_range[0] - distance - allowed_gaps, site_range[1] - distance), (site_range[0] + size - distance - allowed_gaps, site_range[1] + size - distance))]
+        for positions in hit_positions:
+            for position in positions:
+                for shift in range(allowed_gaps + 1):
+                    site = position + distance + shift
+                    if site >= size:
+                        if not strand["circular"]:
+                            continue
+                        site %= size
+                    if pam_pattern.match(genome, site):
+                        sites.add(site)
+    if not strand["circular"]:
+        return [site for site in sorted(sites) if site <= size - len(sequence["pam"])]
+    return sorted(sites)
+
+def estimate_search_cost(sequence: dict, strand: dict, concordance_threshold: int, allowed_mismatches: int, allowed_gaps: int):
+    """Estimate the number of sites of a genome strand checked by the off-target search of a sequence, to balance the tasks.
+
+    Args:
+        sequence (dict): sequence dict
+        strand (dict): genome strand index, see index_genome_strand
+        concordance_threshold (int): threshold of concordance for a sequence to be considered as an off-target
+        allowed_mismatches (int): number of mismatches allowed in an off-target
+        allowed_gaps (int): number of gaps allowed in an off-target
+
+    Returns:
+        int: estimated number of sites
+    """
+    pam_sites = strand["pam_sites"].get(sequence["pam"])
+    cost = len(pam_sites) if pam_sites is not None else len(strand["sequence"])
+    seeds = strand["seeds"]
+    protospacer = sequence["sequence"][:-3]
+    blocks = get_seed_blocks(concordance_threshold, allowed_mismatches, allowed_gaps)
+    if seeds is None or len(blocks) == 0 or concordance_threshold > len(protospacer) or seeds["length"] > min(length for _, length in blocks):
+        return cost
+
+    # Number of seed hits, see find_seed_sites
+    nb_hits = 0
+    for distance, _ in blocks:
+        code = encode_seed(protospacer[len(protospacer)-distance:len(protospacer)-distance+seeds["length"]])
+        if code is None:
+            return cost
+        nb_hits += seeds["offsets"][code+1] - seeds["offsets"][code]
+    return min(cost, nb_hits * (allowed_gaps + 1))
+
+def get_seed_checks(protospacer: str, concordance_threshold: int, allowed_mismatches: int, allowed_gaps: int):
+    """Get the seeds of a protospacer to check at a PAM site before extending it, one of them matching the genome exactly.
+
+    Args:
+        protospacer (str): sequence preceding the PAM
+        concordance_threshold (int): threshold of concordance for a sequence to be considered as an off-target
+        allowed_mismatches (int): number of mismatches allowed in an off-target
+        allowed_gaps (int): number of gaps allowed in an off-target
+
+    Returns:
+        list: distance of the seed start to the PAM and seed sequence, empty if the sites cannot be checked
+    """
+    seed_checks = []
+    for distance, length in get_seed_blocks(concordance_threshold, allowed_mismatches, allowed_gaps):
+        for shift in range(allowed_gaps + 1):
+            if distance + shift <= len(protospacer):
+                seed_checks.append((distance + shift, protospacer[len(protospacer)-distance:len(protospacer)-distance+length]))
+    return seed_checks
+
+def get_genome_window(genome: str, site: int, length: int, circular: bool = True):
+    """Get the nucleotides preceding a site of a circularized genome sequence.
+
+    Args:
+        genome (str): genome sequence extended with its first two nucleotides
+        site (int): index of the site
+        length (int): number of nucleotides
+        circular (bool): the genome is circular, otherwise the window stops at the origin
+
+    Returns:
+        str: sequence of the nucleotides preceding the site
+    """
+    start = site - length
+    if start >= 0:
+        return genome[start:site]
+    if not circular:
+        return genome[:site]
+    return genome[start-2: -2] + genome[:site]
+
+def search_off_target(sequence: dict, strand: dict, concordance_threshold: int, allowed_mismatches: int, allowed_gaps: int, max_off_targets: int = None, site_range: tuple = None):
+    """Check if the sequence has off-targets on an indexed genome strand, visiting only its PAM sites.
+
+    Args:
+        sequence (dict): sequence dict
+        strand (dict): genome strand index, see index_genome_strand
+        concordance_threshold (int): threshold of concordance for a sequence to be considered as an off-target
+        allowed_mismatches (int): number of mismatches allowed in an off-target
+        allowed_gaps (int): number of gaps allowed in an off-target
+        max_off_targets (int): the search stops as soon as more off-targets are found, None to find all of them
+        site_range (tuple): start and stop of the PAM sites searched, see get_shard_ranges, None to search every site
+
+    Returns:
+        list: list of off-targets index in the genome sequence
+    """
+    genome = strand["sequence"]
+    protospacer = sequence["sequence"][:-3]
+
+    # The sequence is too short to reach the concordance threshold
+    if concordance_threshold > len(protospacer):
+        return []
+
+    pam_sites = find_seed_sites(sequence, strand, concordance_threshold, allowed_mismatches, allowed_gaps, site_range)
+    if pam_sites is None:
+        pam_sites = strand["pam_sites"].get(sequence["pam"])
+    if pam_sites is None:
+        pam_sites = find_pam_sites(genome, sequence["pam"])
+    if site_range is not None:
+        pam_sites = pam_sites[bisect_left(pam_sites, site_range[0]):bisect_left(pam_sites, site_range[1])]
+
+    seed_checks = get_seed_checks(protospacer, concordance_threshold, allowed_mismatches, allowed_gaps)
+    off_targets = []
+    extensions = 0
+    for i in pam_sites:
+        if seed_checks and i >= len(protospacer):
+            for back, seed in seed_checks:
+                if genome.startswith(seed, i - back):
+                    break
+            else:
+                continue
+        extensions += 1
+        step_off_target(off_targets, protospacer, get_genome_window(genome, i, len(protospacer), strand["circular"]), i, concordance_threshold, allowed_mismatches, allowed_gaps, result=genome[i:i+3])
+        if max_off_targets is not None and len(off_targets) > max_off_targets:
+            break
+
+    if collect_metrics:
+        add_metric("counters", "pam_sites_visited", len(pam_sites))
+        add_metric("counters", "extensions", extensions)
+        add_metric("counters", "off_targets_found", len(off_targets))
+    return off_targets
+
+def search_off_target_batch(sequences: list, strand: dict, concordance_threshold: int, allowed_mismatches: int, allowed_gaps: int, max_off_targets: int = None, site_range: tuple = None):
+    """Check the off-targets of many sequences on an indexed genome strand in a single sweep of its PAM sites.
+
+    The sequences are grouped by PAM and their seeds are gathered in tables keyed by the position of
+    the seed before the PAM, so that each PAM site is only extended for the sequences sharing a seed
+    with the genome.
+
+    Args:
+        sequences (list): list of sequence dicts
+        strand (dict): genome strand index, see index_genome_strand
+        concordance_threshold (int): threshold of concordance for a sequence to be considered as an off-target
+        allowed_mismatches (int): number of mismatches allowed in an off-target
+        allowed_gaps (int): number of gaps allowed in an off-target
+        max_off_targets (int): the search of a sequence stops as soon as more off-targets are found, None to find all of them
+        site_range (tuple): start and stop of the PAM sites searched, see get_shard_ranges, None to search every site
+
+    Returns:
+        list: list of off-targets of each sequence, in the order of the sequences
+    """
+    genome = strand["sequence"]
+    results = [[] for _ in sequences]
+    exceeded = set()
+
+    # Group the sequences by PAM and index their seeds
+    groups = {}
+    for id, sequence in enumerate(sequences):
+        protospacer = sequence["sequence"][:-3]
+        if concordance_threshold > len(protospacer):
+            continue
+        group = groups.setdefault(sequence["pam"], {"seeds": {}, "unseeded": [], "all": [], "window": 0})
+        group["all"].append(id)
+        group["window"] = max(group["window"], len(protospacer))
+        seed_checks = get_seed_checks(protospacer, concordance_threshold, allowed_mismatches, allowed_gaps)
+        if len(seed_checks) == 0:
+            group["unseeded"].append(id)
+        for back, seed in seed_checks:
+            group["seeds"].setdefault((back, len(seed)), {}).setdefault(seed, set()).add(id)
+
+    pam_sites_visited = 0
+    extensions = 0
+    for pam, group in groups.items():
+        pam_sites = strand["pam_sites"].get(pam)
+        if pam_sites is None:
+            pam_sites = find_pam_sites(genome, pam)
+        if site_range is not None:
+            pam_sites = pam_sites[bisect_left(pam_sites, site_range[0]):bisect_left(pam_sites, site_range[1])]
+        seed_tables = list(group["seeds"].items())
+
+        for i in pam_sites:
+            # The seeds of the sites close to the origin wrap around the genome
+            if i < group["window"]:
+                ids = group["all"]
+            else:
+                ids = set(group["unseeded"])
+                for (back, length), table in seed_tables:
+                    hits = table.get(genome[i-back:i-back+length])
+                    if hits is not None:
+                        ids |= hits
+                ids = sorted(ids)
+
+            extensions += len(ids)
+            for id in ids:
+                if exceeded and id in exceeded:
+                    continue
+                protospacer = sequences[id]["sequence"][:-3]
+                step_off_target(results[id], protospacer, get_genome_window(genome, i, len(protospacer), strand["circular"]), i, concordance_threshold, allowed_mismatches, allowed_gaps, result=genome[i:i+3])
+                if max_off_targets is not None and len(results[id]) > max_off_targets:
+                    exceeded.add(id)
+        pam_sites_visited += len(pam_sites)
+
+    if collect_metrics:
+        add_metric("counters", "pam_sites_visited", pam_sites_visited)
+        add_metric("counters", "extensions", extensions)
+        add_metric("counters", "off_targets_found", sum(len(off_targets) for off_targets in results))
+    return results
+
+def get_shard_ranges(contig_sizes: list, shard: int, nb_shards: int):
+    """Get the PAM sites of each contig searched in a shard, the contigs laid end to end being split into shards of equal length.
+
+    Each PAM site belongs to a single shard, while the window preceding it is read from the whole contig: the windows
+    overlapping the previous shard or wrapping around the origin of a circular contig are found as in a single search,
+    and the off-targets of the shards concatenated in order are the off-targets of a single search.
+
+    Args:
+        contig_sizes (list): size of each contig
+        shard (int): index of the shard
+        nb_shards (int): number of shards
+
+    Returns:
+        list: start and stop of the PAM sites of each contig in the shard, empty for the contigs outside the shard
+    """
+    total = sum(contig_sizes)
+    start = total * shard // nb_shards
+    stop = total * (shard + 1) // nb_shards
+    ranges = []
+    offset = 0
+    for size in contig_sizes:
+        contig_start = max(start - offset, 0)
+        contig_stop = min(stop - offset, size)
+        ranges.append((contig_start, max(contig_start, contig_stop)))
+        offset += size
+    return ranges
+
+def check_off_target(sequence: dict, genome: str, concordance_threshold: int, allowed_mismatches: int, allowed_gaps: int):
+    """Check if the sequence has off-targets in the genome sequence.
+
+    Args:
+        sequence (dict): sequence dict
+        genome (str): genome sequence
+        concordance_threshold (int): threshold of concordance for a sequence to be considered as an off-target
+    
+    Returns:
+        list: list of off-targets index in the genome sequence
+    """
+    strand = index_genome_strand(genome, [sequence["pam"]])
+    return search_off_target(sequence, strand, concordance_threshold, allowed_mismatches, allowed_gaps)
+
+def open_fasta(path: str):
+    """Open a FASTA file as text, decompressing it if it is gzipped.
+
+    Args:
+        path (str): path of the file
+
+    Returns:
+        file: text file
+    """
+    with open(path, "rb") as file:
+        gzipped = file.read(2) == b"\x1f\x8b"
+    return gzip.open(path, "rt") if gzipped else open(path, "r")
+
+def read_fasta(path: str):
+    """Read the records of a FASTA file one by one, the sequences may be wrapped over several lines.
+
+    Args:
+        path (str): path of the file, possibly gzipped
+
+    Yields:
+        tuple: header line of the record and its sequence
+    """
+    with open_fasta(path) as file:
+        header = None
+        lines = []
+        for line in file:
+            line = line.strip()
+            if line.startswith(">"):
+                if header is not None:
+                    yield header, "".join(lines)
+                header = line
+                lines = []
+            elif header is not None and line:
+                lines.append(line)
+        if header is not None:
+            yield header, "".join(lines)
+
+def read_genome(path: str, linear_contigs: list = []):
+    """Read the contigs of a genome FASTA file (chromosomes, plasmids...).
+
+    Args:
+        path (str): path of the file, possibly gzipped
+        linear_contigs (list): names of the linear contigs, the other contigs are circular unless their header contains "topology=linear"
+
+    Returns:
+        list: list of contig dicts with their name, sequence and topology
+    """
+    contigs = []
+    for header, sequence in read_fasta(path):
+        name = header[1:].split()[0] if len(header) > 1 else ""
+        circular = name not in linear_contigs and "topology=linear" not in header
+        contigs.append({"name": name, "sequence": sequence, "circular": circular})
+    return contigs
+
+def get_result_name(fasta_file: str, result_format: str = "txt"):
+    """Get the name of the result file of a FASTA file.
+
+    Args:
+        fasta_file (str): fasta file name, possibly gzipped
+        result_format (str): format of the result file, see RESULT_FORMATS
+
+    Returns:
+        str: result file name
+    """
+    for extension in FASTA_EXTENSIONS:
+        if fasta_file.endswith(extension):
+            fasta_file = fasta_file[:-len(extension)]
+            break
+    return "results_" + fasta_file + "." + result_format
+
+# Formats of the result files and columns of the TSV result file
+RESULT_FORMATS = ("txt", "jsonl", "tsv")
+TSV_COLUMNS = ["entry", "candidate", "deaminase_strand", "sequence", "pam", "target", "index", "CI_index", "type", "off_target_sequence", "concordance", "contig", "genome_strand", "start", "end", "specificity"]
+
+def get_entry_records(entry_name, sequences, off_targets, CI_off_targets, contig_sizes, scores = None):
+    """Get the records of the possible sequences of a FASTA entry with their replicas and off-targets, for the structured result files.
+
+    Args:
+        entry_name (str): name of the entry
+        sequences (list): list of the possible sequences
+        off_targets (list): off-targets of each sequence on the coding strand of the genome
+        CI_off_targets (list): off-targets of each sequence on the complementary strand of the genome
+        contig_sizes (dict): size of each contig of the genome
+        scores (list): specificity score of each sequence in screening mode, see score_candidate
+
+    Returns:
+        list: record of each possible sequence
+    """
+    records = []
+    for j, sequence in enumerate(sequences):
+        record = {"entry": entry_name[1:] if entry_name.startswith(">") else entry_name,
+                  "candidate": j + 1,
+                  "deaminase_strand": sequence["deaminase_strand"],
+                  "sequence": sequence["sequence"],
+                  "pam": sequence["pam"],
+                  "target": sequence["target"],
+                  "index": sequence["index"],
+                  "CI_index": sequence["CI_index"],
+                  "specificity": scores[j] if scores is not None else None,
+                  "replicas": [],
+                  "off_targets": []}
+        for strand, strand_off_targets in (("coding", off_targets[j]), ("complementary", CI_off_targets[j])):
+            for off_target in strand_off_targets:
+                contig, start, end = get_off_target_location(off_target, strand, contig_sizes)
+                location = {"contig": contig, "genome_strand": strand, "start": start, "end": end}
+                if off_target["sequence"] == sequence["sequence"]:
+                    record["replicas"].append(location)
+                else:
+                    record["off_targets"].append(dict(location, sequence=off_target["sequence"], concordance=off_target["concordance"]))
+        records.append(record)
+    return records
+
+def open_result_files(dir_path: str, fasta_file: str, formats: list, save: bool = True):
+    """Open the result files of a FASTA file, written entry by entry in temporary files until the analysis is complete.
+
+    Args:
+        dir_path (str): directory path
+        fasta_file (str): fasta file name
+        formats (list): formats of the result files, see RESULT_FORMATS
+        save (bool): save the results in files, if False the text results are printed in the console
+
+    Returns:
+        dict: temporary file and path of the result file of each format
+    """
+    files = {}
+    try:
+        for result_format in formats:
+            if result_format not in RESULT_FORMATS:
+                raise ValueError(f"Unknown result format {result_format}, expected one of {RESULT_FORMATS}")
+            if save:
+                path = os.path.join(dir_path, get_result_name(fasta_file, result_format))
+                file = open(os.path.join(dir_path, "." + get_result_name(fasta_file, result_format) + ".part"), "w+")
+            else:
+                path = None
+                file = tempfile.TemporaryFile("w+")
+            if result_format == "tsv":
+                file.write("\t".join(TSV_COLUMNS) + "\n")
+            files[result_format] = {"file": file, "path": path}
+    except BaseException:
+        close_result_files(files, 0, 0, 0, True)
+        raise
+    return files
+
+def write_result_entry(files: dict, entry_name, sequences, off_targets, CI_off_targets, contig_sizes, scores = None):
+    """Write the results of a FASTA entry in every result file.
+
+    Args:
+        files (dict): result files, see open_result_files
+        entry_name (str): name of the entry
+        sequences (list): list of the possible sequences
+        off_targets (list): off-targets of each sequence on the coding strand of the genome
+        CI_off_targets (list): off-targets of each sequence on the complementary strand of the genome
+        contig_sizes (dict): size of each contig of the genome
+        scores (list): specificity score of each sequence in screening mode, see score_candidate
+    """
+    if "txt" in files:
+        files["txt"]["file"].write(report_entry(entry_name, sequences, off_targets, CI_off_targets, contig_sizes, scores))
+    if "jsonl" not in files and "tsv" not in files:
+        return
+
+    records = get_entry_records(entry_name, sequences, off_targets, CI_off_targets, contig_sizes, scores)
+    if "jsonl" in files:
+        for record in records:
+            files["jsonl"]["file"].write(json.dumps(record) + "\n")
+    if "tsv" in files:
+        for record in records:
+            candidate = [record[column] for column in TSV_COLUMNS[:8]]
+            specificity = [record["specificity"] if record["specificity"] is not None else ""]
+            rows = [["replica", "", ""] + [replica[column] for column in TSV_COLUMNS[11:15]] for replica in record["replicas"]]
+            rows += [["off_target", off_target["sequence"], off_target["concordance"]] + [off_target[column] for column in TSV_COLUMNS[11:15]] for off_target in record["off_targets"]]
+            for row in rows or [["candidate"] + [""] * 6]:
+                files["tsv"]["file"].write("\t".join(str(value) for value in candidate + row + specificity) + "\n")
+
+def write_ready_entries(files: dict, entries: deque, results: dict, contig_sizes: dict, checkpoint: dict = None, screening: dict = None, references: dict = None):
+    """Write the pending entries in order, up to the first entry whose candidates are still searched.
+
+    Args:
+        files (dict): result files, see open_result_files
+        entries (deque): names, possible sequences and checkpoint keys of the pending entries, the written entries being removed
+        results (dict): off-targets on the coding and the complementary strands of each candidate key, None while searched
+        contig_sizes (dict): size of each contig of the genome
+        checkpoint (dict): checkpoint of the analysis where the written entries are saved, see open_checkpoint
+        screening (dict): off-target budget and number of candidates reported per entry, see screen_entry, None to report all the candidates
+        references (dict): number of pending entries containing each candidate key, the off-targets of a candidate being removed
+                           from the results once its last entry is written, None to keep all the results
+
+    Returns:
+        int: number of entries written with at least one possible sequence
+        int: number of possible sequences written
+    """
+    nb_KO = 0
+    nb_targets = 0
+    while len(entries) > 0 and all(results[get_candidate_key(sequence)] is not None for sequence in entries[0][1]):
+        entry_name, sequences, entry_key = entries.popleft()
+        entry_results = [results[get_candidate_key(sequence)] for sequence in sequences]
+        off_targets = [result[0] for result in entry_results]
+        CI_off_targets = [result[1] for result in entry_results]
+        if checkpoint is not None:
+            store_checkpoint_entry(checkpoint, entry_key, sequences, off_targets, CI_off_targets)
+        if references is not None:
+            for candidate_key in map(get_candidate_key, sequences):
+                references[candidate_key] -= 1
+                if references[candidate_key] == 0:
+                    del references[candidate_key], results[candidate_key]
+        if screening is not None:
+            sequences, off_targets, CI_off_targets, scores = screen_entry(sequences, off_targets, CI_off_targets, screening["off_target_budget"], screening["top_candidates"])
+        else:
+            scores = None
+        write_result_entry(files, entry_name, sequences, off_targets, CI_off_targets, contig_sizes, scores)
+        nb_targets += len(sequences)
+        if len(sequences) > 0:
+            nb_KO += 1
+    if checkpoint is not None:
+        checkpoint["connection"].commit()
+    return nb_KO, nb_targets
+
+def close_result_files(files: dict, nb_KO: int, nb_entries: int, nb_targets: int, failed: bool = False):
+    """Complete the result files with the summary of the analysis, or discard them if the analysis failed.
+
+    Args:
+        files (dict): result files, see open_result_files
+        nb_KO (int): number of entries with at least one possible sequence
+        nb_entries (int): number of entries
+        nb_targets (int): number of possible sequences
+        failed (bool): the analysis failed, the temporary files are removed
+    """
+    for result_format, result_file in files.items():
+        file = result_file["file"]
+        if failed:
+            file.close()
+            if result_file["path"] is not None:
+                os.remove(file.name)
+            continue
+
+        if result_format != "txt":
+            file.close()
+            os.replace(file.name, result_file["path"])
+            continue
+
+        # The summary of the text report precedes the entries
+        summary = f"Number of KO: {nb_KO}/{nb_entries} - {round(nb_KO/nb_entries*100, 2)}%\n"
+        summary += f"Number of potential targets found among all genes: {nb_targets}\n\n"
+        summary += "---------------------------------------------\n\n"
+        file.seek(0)
+        if result_file["path"] is None:
+            print(summary + file.read())
+            file.close()
+            continue
+        with open(result_file["path"], "w") as output:
+            output.write(summary)
+            shutil.copyfileobj(file, output)
+        file.close()
+        os.remove(file.name)
+
+def analyse_fasta_file(dir_path: str, fasta_file: str, genome_file: str, save: bool, targets: list, pams: list, deaminase_window: list, concordance_threshold: int, allowed_mismatches: int, nb_processes: int = 1, batch: bool = False, pool: ProcessPoolExecutor = None):
+    """Analyse a fasta file to find the possible sequences, excluding the off-targets.
+
+    Args:
+        dir_path (str): directory path
+        fasta_file (str): fasta file name
+        genome_file (str): genome file name
+        save (bool): save the results in a file, if False the results are printed in the console
+        targets (list): list of target codons with the index of the target nucleotide in the codon
+        pams (list): list of PAM sequences
+        deaminase_window (list): upper and lower bounds of the deaminase window
+        concordance_threshold (int): threshold of concordance for a sequence to be considered as an off-target
+        allowed_mismatches (int): number of mismatches allowed in an off-target
+        nb_processes (int): number of processes to use
+        batch (bool): check the off-targets of the entries in single sweeps of the genome, batch_entries at a time, instead of entry by entry
+        pool (ProcessPoolExecutor): pool of processes to use, a pool of nb_processes is created for this analysis if None
+    """
+    # Metrics and profile of the analysis, the workers sending the metrics of each task and saving their profile next to the one of the main process
+    analysis_start = time.perf_counter()
+    if collect_metrics:
+        reset_metrics()
+    analysis_metrics = {"timers": {}, "counters": {}, "workers": {}, "candidates": {}}
+    profile_path = os.path.join(dir_path, get_result_name(fasta_file, "prof")) if profile_runs and save else None
+    if profile_path is not None:
+        profile = cProfile.Profile()
+        profile.enable()
+
+    # Read the contigs of the genome, the FASTA entries are streamed to the processes
+    stage_start = time.perf_counter()
+    contigs = read_genome(os.path.join(dir_path, genome_file), linear_contigs)
+    entries = read_fasta(os.path.join(dir_path, fasta_file))
+    genome_key = get_genome_key(contigs)
+    if collect_metrics:
+        add_metric("timers", "read_genome", time.perf_counter() - stage_start)
+        stage_start = time.perf_counter()
+
+    # Index the PAM sites and the seeds of both strands of every contig once for all the candidates, the single sweep does not use the seed table
+    seed_length = 0 if batch else get_seed_length(concordance_threshold, allowed_mismatches, allowed_gaps)
+    reference_index = load_reference_index(contigs, pams, seed_length, index_cache_directory, index_cache_size, genome_key)
+    contig_sizes = {genome_index["name"]: genome_index["size"] for genome_index in reference_index["contigs"]}
+    del contigs
+    if collect_metrics:
+        add_metric("timers", "index_genome", time.perf_counter() - stage_start)
+
+    parameters = {"targets": targets,
+                  "pams": pams,
+                  "deaminase_window": deaminase_window,
+                  "concordance_threshold": concordance_threshold,
+                  "allowed_mismatches": allowed_mismatches,
+                  "allowed_gaps": allowed_gaps,
+                  "off_target_budget": off_target_budget,
+                  "collect_metrics": collect_metrics,
+                  "profile_path": profile_path}
+    screening = {"off_target_budget": off_target_budget, "top_candidates": top_candidates} if off_target_budget is not None or top_candidates is not None else None
+
+    # The shared reference index, the caches and the pool of this analysis are released even if the analysis fails before using them
+    shared_memory = None
+    cache = None
+    checkpoint = None
+    own_pool = pool is None
+    files = None
+    nb_entries = 0
+    nb_KO = 0
+    nb_targets = 0
+    failed = True
+    try:
+        # Share the reference index with the processes, the tasks only carry the candidates
+        shared_memory, shared_index = share_reference_index(reference_index)
+
+        # Off-targets of the candidates found in the previous runs and results of the entries already analysed with the same genome and parameters
+        cache = open_off_target_cache(off_target_cache_file, genome_key, parameters, off_target_cache_size) if off_target_cache_file is not None else None
+        checkpoint = open_checkpoint(os.path.join(dir_path, get_checkpoint_name(fasta_file)), genome_key, parameters) if checkpoint_runs else None
+
+        # Use the pool of the caller or a pool for this analysis only
+        if own_pool:
+            pool = create_pool(nb_processes)
+
+        # Find the possible sequences of the entries as soon as they are read
+        finder = compile_candidate_finder(targets, pams, deaminase_window)
+        entries_names = []
+        entries_sequences = []
+        entries_keys = []
+        results = {}
+        references = {}
+        nb_searched = 0
+        batch_sequences = []
+        batch_groups = {}
+        nb_batch_entries = 0
+        futures = []
+        tasks = []
+        held_chunks = []
+        chunk = []
+        cost = 0
+        stage_start = time.perf_counter()
+        for entry_name, sample in entries:
+            entry_key = get_entry_key(checkpoint, sample) if checkpoint is not None else None
+            entry_results = get_checkpoint_entry(checkpoint, entry_key) if checkpoint is not None else None
+            if entry_results is not None:
+                # Entry unchanged since an interrupted or a previous run
+                sequences = entry_results["sequences"]
+                for sequence, off_targets, CI_off_targets in zip(sequences, entry_results["off_targets"], entry_results["CI_off_targets"]):
+                    results[get_candidate_key(sequence)] = (off_targets, CI_off_targets)
+            elif collect_metrics:
+                find_start = time.perf_counter()
+                sequences = find_candidates(finder, sample)
+                add_metric("timers", "find_candidates", time.perf_counter() - find_start)
+            else:
+                sequences = find_candidates(finder, sample)
+            entries_names.append(entry_name)
+            entries_sequences.append(sequences)
+            entries_keys.append(entry_key)
+
+            # The off-targets of a candidate are searched once, identical candidates of other entries or of previous runs reuse them,
+            # and kept until the last entry containing the candidate is written
+            for sequence in sequences:
+                candidate_key = get_candidate_key(sequence)
+                references[candidate_key] = references.get(candidate_key, 0) + 1
+                if candidate_key in results:
+                    continue
+                results[candidate_key] = get_cached_off_targets(cache, candidate_key) if cache is not None else None
+                if results[candidate_key] is not None:
+                    continue
+                nb_searched += 1
+                if collect_metrics:
+                    analysis_metrics["candidates"].setdefault(entry_name, []).append(candidate_key)
+                if batch:
+                    batch_sequences.append(sequence)
+                    continue
+
+                # Check the off-targets of the candidates by chunks of similar estimated cost, sent as soon as they are full,
+                # the first chunks being held until there are enough of them to keep every process busy
+                chunk.append(sequence)
+                cost += sum(estimate_search_cost(sequence, genome_index[strand], concordance_threshold, allowed_mismatches, allowed_gaps) for genome_index in reference_index["contigs"] for strand in ("coding", "complementary"))
+                if cost >= chunk_cost:
+                    held_chunks.append(chunk)
+                    if len(tasks) > 0 or len(held_chunks) >= nb_processes:
+                        for held_chunk in held_chunks:
+                            submit_chunk_tasks(pool, shared_index, parameters, held_chunk, genome_shards or 1, tasks, futures)
+                        held_chunks = []
+                    chunk = []
+                    cost = 0
+
+            # The single sweeps check the candidates of batch_entries entries, written and saved in the checkpoint as soon as their sweep is complete
+            if batch:
+                nb_batch_entries += 1
+                if batch_entries is not None and nb_batch_entries >= batch_entries:
+                    if len(batch_sequences) > 0:
+                        first = len(tasks)
+                        submit_batch_tasks(pool, shared_index, parameters, batch_sequences, pams, len(reference_index["contigs"]), nb_processes, tasks, futures)
+                        batch_groups[first] = (batch_sequences, len(tasks) - first, {})
+                    batch_sequences = []
+                    nb_batch_entries = 0
+        if len(chunk) > 0:
+            held_chunks.append(chunk)
+
+        # Fewer chunks than processes search shards of the genome in parallel
+        if len(held_chunks) > 0:
+            nb_shards = genome_shards if genome_shards is not None else 1 if len(tasks) > 0 else -(-nb_processes // len(held_chunks))
+            for held_chunk in held_chunks:
+                submit_chunk_tasks(pool, shared_index, parameters, held_chunk, nb_shards, tasks, futures)
+
+        if len(batch_sequences) > 0:
+            first = len(tasks)
+            submit_batch_tasks(pool, shared_index, parameters, batch_sequences, pams, len(reference_index["contigs"]), nb_processes, tasks, futures)
+            batch_groups[first] = (batch_sequences, len(tasks) - first, {})
+
+        if collect_metrics:
+            add_metric("timers", "read_entries", time.perf_counter() - stage_start - metrics["timers"].get("find_candidates", 0))
+            search_start = time.perf_counter()
+
+        # Write the entries in order as soon as the off-targets of all their candidates are found, the off-targets being cached as soon as they are found
+        max_off_targets = get_search_limit(parameters)
+        files = open_result_files(dir_path, fasta_file, result_formats if save else ["txt"], save)
+        pending_entries = deque(zip(entries_names, entries_sequences, entries_keys))
+        nb_entries = len(entries_names)
+        del entries_names, entries_sequences, entries_keys
+        sharded_results = {}
+        candidate_seconds = {}
+        for id, (task_results, task_metrics) in complete_tasks(futures, task_timeout):
+            strand, sequences = tasks[id][:2]
+            if task_metrics is not None:
+                merge_metrics(analysis_metrics, task_metrics)
+                for candidate_key, seconds in zip(map(get_candidate_key, sequences), task_metrics.get("candidates", [])):
+                    candidate_seconds[candidate_key] = candidate_seconds.get(candidate_key, 0) + seconds
+            if strand is not None:
+                # Tasks of the sweep of a group of entries, gathered once they are all complete
+                sequences, nb_sweep_tasks, batch_results = batch_groups[tasks[id][2]]
+                batch_results[id] = task_results
+                if len(batch_results) < nb_sweep_tasks:
+                    continue
+                del batch_groups[tasks[id][2]]
+                gather_batch_results(sequences, tasks, batch_results, results)
+                del batch_results
+            else:
+                task_results = gather_chunk_results(tasks, id, task_results, sharded_results)
+                if task_results is None:
+                    continue
+                for sequence, sequence_results in zip(sequences, task_results):
+                    results[get_candidate_key(sequence)] = sequence_results
+            write_start = time.perf_counter()
+            if cache is not None:
+                store_off_targets(cache, {get_candidate_key(sequence): results[get_candidate_key(sequence)] for sequence in sequences}, max_off_targets)
+            entries_KO, entries_targets = write_ready_entries(files, pending_entries, results, contig_sizes, checkpoint, screening, references)
+            nb_KO += entries_KO
+            nb_targets += entries_targets
+            if collect_metrics:
+                add_metric("timers", "write_results", time.perf_counter() - write_start)
+        if collect_metrics:
+            search_time = time.perf_counter() - search_start
+            add_metric("timers", "search_off_targets", search_time - metrics["timers"].get("write_results", 0))
+            write_start = time.perf_counter()
+
+        # Write the remaining entries, whose candidates were all cached or found in the checkpoint
+        entries_KO, entries_targets = write_ready_entries(files, pending_entries, results, contig_sizes, checkpoint, screening, references)
+        nb_KO += entries_KO
+        nb_targets += entries_targets
+        if collect_metrics:
+            add_metric("timers", "write_results", time.perf_counter() - write_start)
+        failed = False
+    finally:
+        # Stop the pool of this analysis, killing its processes if the analysis failed, and release the shared reference index
+        if own_pool and pool is not None:
+            stop_pool(pool, failed)
+        if cache is not None:
+            close_off_target_cache(cache)
+        if checkpoint is not None:
+            close_checkpoint(checkpoint, not failed)
+        if shared_memory is not None:
+            shared_memory.close()
+            shared_memory.unlink()
+        if files is not None:
+            close_result_files(files, nb_KO, nb_entries, nb_targets, failed)
+        if profile_path is not None:
+            profile.disable()
+
+    # Merge the profiles of the processes
+    if profile_path is not None:
+        profile_stats = pstats.Stats(profile)
+        worker_profiles = [os.path.join(dir_path, file) for file in os.listdir(dir_path) if file.startswith(os.path.basename(profile_path) + ".")]
+        for worker_profile in worker_profiles:
+            profile_stats.add(worker_profile)
+            os.remove(worker_profile)
+        profile_stats.dump_stats(profile_path)
+
+    if collect_metrics:
+        summary = summarize_metrics(analysis_metrics, candidate_seconds, time.perf_counter() - analysis_start, search_time)
+        summary["counters"].update(entries=nb_entries, candidates=nb_targets, searched_candidates=nb_searched)
+        if save:
+            with open(os.path.join(dir_path, get_result_name(fasta_file, "metrics.json")), "w") as file:
+                json.dump(summary, file, indent=4)
+        else:
+            print(json.dumps(summary, indent=4))
+
+# Parameters which can be swept and columns of the summary table of a sweep
+SWEEP_PARAMETERS = ("targets", "pams", "deaminase_window", "concordance_threshold", "allowed_mismatches", "allowed_gaps")
+SWEEP_COLUMNS = ["configuration", *SWEEP_PARAMETERS, "nb_entries", "nb_KO", "KO_percent", "nb_targets", "nb_specific_KO", "nb_specific_targets"]
+
+def get_sweep_configurations(parameter_sweep: dict, parameters: dict):
+    """Get the configurations of a parameter sweep, every combination of the swept values.
+
+    Args:
+        parameter_sweep (dict): values of each swept parameter, see SWEEP_PARAMETERS
+        parameters (dict): values of the parameters which are not swept
+
+    Returns:
+        list: parameters of each configuration
+    """
+    for name in parameter_sweep:
+        if name not in SWEEP_PARAMETERS:
+            raise ValueError(f"Unknown swept parameter {name}, expected one of {SWEEP_PARAMETERS}")
+    names = list(parameter_sweep)
+    return [dict(parameters, **dict(zip(names, values))) for values in product(*(parameter_sweep[name] for name in names))]
+
+def filter_off_targets(off_targets: list, concordance_threshold: int, allowed_mismatches: int, allowed_gaps: int):
+    """Filter the off-targets found with looser search parameters, giving the off-targets found with stricter ones.
+
+    Args:
+        off_targets (list): list of off-targets
+        concordance_threshold (int): threshold of concordance for a sequence to be considered as an off-target
+        allowed_mismatches (int): number of mismatches allowed in an off-target
+        allowed_gaps (int): number of gaps allowed in an off-target
+
+    Returns:
+        list: list of the off-targets within the stricter parameters
+    """
+    return [off_target for off_target in off_targets if off_target["concordance"] >= concordance_threshold and off_target["mismatches"] <= allowed_mismatches and off_target["gaps"] <= allowed_gaps]
+
+def sweep_fasta_file(dir_path: str, fasta_file: str, genome_file: str, save: bool, configurations: list, nb_processes: int = 1, pool: ProcessPoolExecutor = None):
+    """Evaluate several configurations of parameters on a fasta file, summarizing the possible sequences found with each of them.
+
+    The genome is read and indexed once for the PAMs of all the configurations. The candidates are found once for
+    each set of targets, PAMs and deaminase window, and their off-targets are searched once with the loosest
+    search parameters, then filtered for each configuration.
+
+    Args:
+        dir_path (str): directory path
+        fasta_file (str): fasta file name
+        genome_file (str): genome file name
+        save (bool): save the summary in a file, if False the summary is printed in the console
+        configurations (list): parameters of each configuration, see get_sweep_configurations
+        nb_processes (int): number of processes to use
+        pool (ProcessPoolExecutor): pool of processes to use, a pool of nb_processes is created for this sweep if None
+
+    Returns:
+        list: summary of each configuration
+    """
+    # Read and index the genome once for the PAMs of every configuration
+    contigs = read_genome(os.path.join(dir_path, genome_file), linear_contigs)
+    genome_key = get_genome_key(contigs)
+    sweep_pams = list(dict.fromkeys(pam for configuration in configurations for pam in configuration["pams"]))
+    reference_index = load_reference_index(contigs, sweep_pams, 0, index_cache_directory, index_cache_size, genome_key)
+    del contigs
+
+    # The off-targets found with the loosest search parameters contain the off-targets of every configuration
+    parameters = {"concordance_threshold": min(configuration["concordance_threshold"] for configuration in configurations),
+                  "allowed_mismatches": max(configuration["allowed_mismatches"] for configuration in configurations),
+                  "allowed_gaps": max(configuration["allowed_gaps"] for configuration in configurations)}
+
+    # The shared reference index, the cache and the pool of this sweep are released even if the sweep fails before using them
+    shared_memory = None
+    cache = None
+    own_pool = pool is None
+    failed = True
+    try:
+        shared_memory, shared_index = share_reference_index(reference_index)
+        cache = open_off_target_cache(off_target_cache_file, genome_key, parameters, off_target_cache_size) if off_target_cache_file is not None else None
+        if own_pool:
+            pool = create_pool(nb_processes)
+
+        # Find the candidates of the entries once for each set of targets, PAMs and deaminase window
+        finders = {}
+        for configuration in configurations:
+            finder_key = json.dumps([configuration["targets"], configuration["pams"], configuration["deaminase_window"]])
+            if finder_key not in finders:
+                finders[finder_key] = {"finder": compile_candidate_finder(configuration["targets"], configuration["pams"], configuration["deaminase_window"]), "entries": []}
+        results = {}
+        searched_sequences = []
+        for entry_name, sample in read_fasta(os.path.join(dir_path, fasta_file)):
+            for finder in finders.values():
+                sequences = find_candidates(finder["finder"], sample)
+                finder["entries"].append(sequences)
+                for sequence in sequences:
+                    candidate_key = get_candidate_key(sequence)
+                    if candidate_key in results:
+                        continue
+                    results[candidate_key] = get_cached_off_targets(cache, candidate_key) if cache is not None else None
+                    if results[candidate_key] is None:
+                        searched_sequences.append(sequence)
+
+        # Search the off-targets of all the candidates in single sweeps
+        tasks = []
+        futures = []
+        submit_batch_tasks(pool, shared_index, parameters, searched_sequences, sweep_pams, len(reference_index["contigs"]), nb_processes, tasks, futures)
+        batch_results = {id: task_results for id, (task_results, _) in complete_tasks(futures, task_timeout)}
+        gather_batch_results(searched_sequences, tasks, batch_results, results)
+        if cache is not None:
+            store_off_targets(cache, {get_candidate_key(sequence): results[get_candidate_key(sequence)] for sequence in searched_sequences})
+        failed = False
+    finally:
+        if own_pool and pool is not None:
+            stop_pool(pool, failed)
+        if cache is not None:
+            close_off_target_cache(cache)
+        if shared_memory is not None:
+            shared_memory.close()
+            shared_memory.unlink()
+
+    # Summarize each configuration, the specific candidates having no off-target but the target itself
+    summary = []
+    for n, configuration in enumerate(configurations):
+        entries = finders[json.dumps([configuration["targets"], configuration["pams"], configuration["deaminase_window"]])]["entries"]
+        search_parameters = (configuration["concordance_threshold"], configuration["allowed_mismatches"], configuration["allowed_gaps"])
+        row = dict({name: configuration[name] for name in SWEEP_PARAMETERS}, configuration=n+1, nb_entries=len(entries), nb_KO=0, nb_targets=0, nb_specific_KO=0, nb_specific_targets=0)
+        for sequences in entries:
+            nb_specific = 0
+            for sequence in sequences:
+                off_targets, CI_off_targets = results[get_candidate_key(sequence)]
+                if score_candidate(sequence, filter_off_targets(off_targets, *search_parameters), filter_off_targets(CI_off_targets, *search_parameters))[0] == 0:
+                    nb_specific += 1
+            row["nb_KO"] += len(sequences) > 0
+            row["nb_targets"] += len(sequences)
+            row["nb_specific_KO"] += nb_specific > 0
+            row["nb_specific_targets"] += nb_specific
+        row["KO_percent"] = round(row["nb_KO"]/row["nb_entries"]*100, 2) if row["nb_entries"] > 0 else 0
+        summary.append(row)
+
+    table = "\t".join(SWEEP_COLUMNS) + "\n"
+    for row in summary:
+        table += "\t".join(json.dumps(row[column]) if isinstance(row[column], list) else str(row[column]) for column in SWEEP_COLUMNS) + "\n"
+    if save:
+        with open(os.path.join(dir_path, get_result_name(fasta_file, "sweep.tsv")), "w") as file:
+            file.write(table)
+    else:
+        print(table)
+    return summary
+
+def open_reference(genome_path: str, pams: list, seed_length: int = 0):
+    """Read, index and share a genome once to answer many queries, see search_sequences and identify_entries.
+
+    Args:
+        genome_path (str): path of the genome file
+        pams (list): list of PAM sequences indexed
+        seed_length (int): length of the seeds to index, no seed table is built if 0
+
+    Returns:
+        dict: path and key of the genome, reference index, size of each contig and shared reference index, to be closed with close_reference
+    """
+    contigs = read_genome(genome_path, linear_contigs)
+    genome_key = get_genome_key(contigs)
+    reference_index = load_reference_index(contigs, pams, seed_length, index_cache_directory, index_cache_size, genome_key)
+    shared_memory, shared_index = share_reference_index(reference_index)
+    return {"path": genome_path,
+            "genome_key": genome_key,
+            "reference_index": reference_index,
+            "contig_sizes": {genome_index["name"]: genome_index["size"] for genome_index in reference_index["contigs"]},
+            "shared_memory": shared_memory,
+            "shared_index": shared_index}
+
+def close_reference(reference: dict):
+    """Release the shared reference index of a genome opened by open_reference.
+
+    Args:
+        reference (dict): opened genome, see open_reference
+    """
+    reference["shared_memory"].close()
+    reference["shared_memory"].unlink()
+
+def search_sequences(reference: dict, sequences: list, parameters: dict, pool: ProcessPoolExecutor, nb_processes: int = 1):
+    """Search the off-targets of possible sequences on an opened genome, the identical sequences being searched once.
+
+    The sequences are split into at least nb_processes tasks, the genome being sharded when there are fewer sequences than processes,
+    so that a small query is answered by all the processes.
+
+    Args:
+        reference (dict): opened genome, see open_reference
+        sequences (list): list of sequence dicts
+        parameters (dict): identification parameters
+        pool (ProcessPoolExecutor): pool of processes
+        nb_processes (int): number of processes of the pool
+
+    Returns:
+        list: off-targets on the coding and the complementary strands of each sequence
+    """
+    searched_sequences = list({get_candidate_key(sequence): sequence for sequence in sequences}.values())
+    costs = [sum(estimate_search_cost(sequence, genome_index[strand], parameters["concordance_threshold"], parameters["allowed_mismatches"], parameters["allowed_gaps"])
+                 for genome_index in reference["reference_index"]["contigs"] for strand in ("coding", "complementary")) for sequence in searched_sequences]
+    task_cost = min(chunk_cost, sum(costs) / nb_processes)
+
+    chunks = []
+    chunk = []
+    cost = 0
+    for sequence, sequence_cost in zip(searched_sequences, costs):
+        chunk.append(sequence)
+        cost += sequence_cost
+        if cost >= task_cost or sequence is searched_sequences[-1]:
+            chunks.append(chunk)
+            chunk = []
+            cost = 0
+
+    tasks = []
+    futures = []
+    nb_shards = genome_shards if genome_shards is not None else -(-nb_processes // max(len(chunks), 1))
+    for chunk in chunks:
+        submit_chunk_tasks(pool, reference["shared_index"], parameters, chunk, nb_shards, tasks, futures)
+
+    results = {}
+    sharded_results = {}
+    for id, (task_results, _) in complete_tasks(futures, task_timeout):
+        task_results = gather_chunk_results(tasks, id, task_results, sharded_results)
+        if task_results is None:
+            continue
+        for sequence, sequence_results in zip(tasks[id][1], task_results):
+            results[get_candidate_key(sequence)] = sequence_results
+    return [results[get_candidate_key(sequence)] for sequence in sequences]
+
+def identify_entries(reference: dict, entries: list, parameters: dict, pool: ProcessPoolExecutor, nb_processes: int = 1):
+    """Find the possible sequences of entries and their off-targets on an opened genome, all the entries being searched together.
+
+    Args:
+        reference (dict): opened genome, see open_reference
+        entries (list): names and sequences of nucleotides of the entries
+        parameters (dict): identification parameters, the candidates being screened if they contain an off_target_budget or top_candidates, see screen_entry
+        pool (ProcessPoolExecutor): pool of processes
+        nb_processes (int): number of processes of the pool
+
+    Returns:
+        list: records of the possible sequences of each entry, see get_entry_records
+    """
+    finder = compile_candidate_finder(parameters["targets"], parameters["pams"], parameters["deaminase_window"])
+    entries_sequences = [find_candidates(finder, sample) for _, sample in entries]
+    results = search_sequences(reference, [sequence for sequences in entries_sequences for sequence in sequences], parameters, pool, nb_processes)
+    screening = parameters.get("off_target_budget") is not None or parameters.get("top_candidates") is not None
+
+    records = []
+    start = 0
+    for (entry_name, _), sequences in zip(entries, entries_sequences):
+        off_targets = [result[0] for result in results[start:start+len(sequences)]]
+        CI_off_targets = [result[1] for result in results[start:start+len(sequences)]]
+        start += len(sequences)
+        scores = None
+        if screening:
+            sequences, off_targets, CI_off_targets, scores = screen_entry(sequences, off_targets, CI_off_targets, parameters.get("off_target_budget"), parameters.get("top_candidates"))
+        records.append(get_entry_records(entry_name, sequences, off_targets, CI_off_targets, reference["contig_sizes"], scores))
+    return records
+
+COMPLEMENT_TABLE = str.maketrans("ATCGatcg", "TAGCtagc")
+
+# 2 bits codes of the nucleotides, the other characters are stored apart as exceptions
+CODE_TABLE = bytes("ACGT".find(chr(i)) % 4 if chr(i) in "ACGT" else 0 for i in range(256))
+UNPACK_TABLE = ["".join("ACGT"[(byte >> shift) & 3] for shift in (6, 4, 2, 0)) for byte in range(256)]
+
+# Number of packed bytes decoded at once with numpy
+DECODE_BLOCK = 2**18
+
+def get_CI_sequence(sequence: str):
+    """Get the complementary inverse sequence of a DNA sequence.
+
+    Args:
+        sequence (str): DNA sequence
+
+    Returns:
+        str: complementary inverse DNA sequence
+    """
+    return sequence.translate(COMPLEMENT_TABLE)[::-1]
+
+def encode_sequence(sequence: str):
+    """Encode a DNA sequence on 2 bits per nucleotide, the sequence being converted to upper case.
+
+    Args:
+        sequence (str): DNA sequence
+
+    Returns:
+        dict: length, packed codes (4 nucleotides per byte) and runs of other characters (N, ambiguity codes...) as their index, length and character code
+    """
+    sequence = sequence.upper()
+    exceptions = [(match.start(), match.end() - match.start(), ord(match.group(1))) for match in re.finditer(r"([^ACGT])\1*", sequence)]
+    codes = sequence.encode("ascii", "replace").translate(CODE_TABLE) + bytes(-len(sequence) % 4)
+
+    if np is not None:
+        codes = np.frombuffer(codes, dtype=np.uint8)
+        packed = ((codes[0::4] << 6) | (codes[1::4] << 4) | (codes[2::4] << 2) | codes[3::4]).tobytes()
+    else:
+        packed = bytes((codes[i] << 6) | (codes[i+1] << 4) | (codes[i+2] << 2) | codes[i+3] for i in range(0, len(codes), 4))
+
+    return {"length": len(sequence), "packed": packed, "exceptions": exceptions}
+
+def decode_sequence(encoded: dict, start: int = 0, stop: int = None):
+    """Decode a slice of an encoded DNA sequence.
+
+    Args:
+        encoded (dict): encoded sequence, see encode_sequence
+        start (int): index of the first nucleotide
+        stop (int): index after the last nucleotide, the end of the sequence if None
+
+    Returns:
+        str: DNA sequence
+    """
+    stop = encoded["length"] if stop is None else min(stop, encoded["length"])
+    if start >= stop:
+        return ""
+
+    packed = encoded["packed"][start//4:(stop+3)//4]
+    if np is not None:
+        # Decode the packed bytes by blocks into a single array of characters, keeping the temporary arrays small on large genomes,
+        # the array being mapped apart from the heap so that its memory is given back to the system once decoded
+        characters = np.frombuffer(mmap.mmap(-1, stop - start), dtype=np.uint8)
+        nucleotides = np.frombuffer(b"ACGT", dtype=np.uint8)
+        for first in range(0, len(packed), DECODE_BLOCK):
+            block = np.frombuffer(packed[first:first+DECODE_BLOCK], dtype=np.uint8)
+            codes = np.stack([(block >> 6) & 3, (block >> 4) & 3, (block >> 2) & 3, block & 3], axis=1).ravel()
+            skip = start % 4 if first == 0 else 0
+            position = max(first * 4 - start % 4, 0)
+            count = min(len(codes) - skip, len(characters) - position)
+            characters[position:position+count] = nucleotides[codes[skip:skip+count]]
+        for index, length, code in encoded["exceptions"]:
+            if index + length <= start:
+                continue
+            if index >= stop:
+                break
+            characters[max(index, start)-start:min(index + length, stop)-start] = code
+        return str(characters.data, "latin-1")
+
+    sequence = "".join(UNPACK_TABLE[byte] for byte in packed)
+    sequence = sequence[start % 4:start % 4 + stop - start]
+
+    # Restore the exceptions overlapping the slice
+    parts = []
+    end = start
+    for index, length, code in encoded["exceptions"]:
+        if index + length <= start:
+            continue
+        if index >= stop:
+            break
+        run = chr(code) * (min(index + length, stop) - max(index, start))
+        index = max(index, start)
+        parts.append(sequence[end-start:index-start])
+        parts.append(run)
+        end = index + len(run)
+    parts.append(sequence[end-start:])
+    return "".join(parts)
+
+def get_CI_encoded(encoded: dict):
+    """Get the complementary inverse of an encoded DNA sequence.
+
+    Args:
+        encoded (dict): encoded sequence, see encode_sequence
+
+    Returns:
+        dict: encoded complementary inverse sequence
+    """
+    if np is None:
+        return encode_sequence(get_CI_sequence(decode_sequence(encoded)))
+
+    # The complement of a 2 bits code is 3 - code
+    codes = 3 - get_sequence_codes(encoded, False)[::-1]
+    codes = np.concatenate([codes, np.zeros(-len(codes) % 4, dtype=np.uint8)])
+    packed = ((codes[0::4] << 6) | (codes[1::4] << 4) | (codes[2::4] << 2) | codes[3::4]).tobytes()
+    exceptions = [(encoded["length"] - index - length, length, ord(get_CI_sequence(chr(code)))) for index, length, code in reversed(encoded["exceptions"])]
+    return {"length": encoded["length"], "packed": packed, "exceptions": exceptions}
+
+def get_sequence_codes(encoded: dict, mark_exceptions: bool = True):
+    """Unpack the 2 bits codes of an encoded DNA sequence, requires numpy.
+
+    Args:
+        encoded (dict): encoded sequence, see encode_sequence
+        mark_exceptions (bool): give the code 4 to the characters which are not A, C, G or T
+
+    Returns:
+        numpy.ndarray: code of each nucleotide
+    """
+    packed = np.frombuffer(encoded["packed"], dtype=np.uint8)
+    codes = np.stack([(packed >> 6) & 3, (packed >> 4) & 3, (packed >> 2) & 3, packed & 3], axis=1).ravel()[:encoded["length"]]
+    if mark_exceptions:
+        for index, length, _ in encoded["exceptions"]:
+            codes[index:index+length] = 4
+    return codes
+
+# Timers and counters of the current process, see add_metric
+metrics = {"timers": {}, "counters": {}}
+
+def add_metric(kind: str, name: str, value: float):
+    """Add a value to a timer or a counter of the current process, the callers checking collect_metrics first.
+
+    Args:
+        kind (str): "timers" or "counters"
+        name (str): name of the timer or the counter
+        value (float): time in seconds or count to add
+    """
+    metrics[kind][name] = metrics[kind].get(name, 0) + value
+
+def reset_metrics():
+    """Reset the metrics of the current process.
+
+    Returns:
+        dict: metrics recorded before the reset
+    """
+    global metrics
+    previous_metrics = metrics
+    metrics = {"timers": {}, "counters": {}}
+    return previous_metrics
+
+def merge_metrics(total: dict, task_metrics: dict):
+    """Add the metrics of a task to the metrics of the analysis.
+
+    Args:
+        total (dict): metrics of the analysis
+        task_metrics (dict): metrics of the task, see run_task
+    """
+    for kind in ("timers", "counters"):
+        for name, value in task_metrics[kind].items():
+            total[kind][name] = total[kind].get(name, 0) + value
+    worker = total["workers"].setdefault(str(task_metrics["worker"]), {"busy": 0, "tasks": 0})
+    worker["busy"] += task_metrics["busy"]
+    worker["tasks"] += 1
+
+def summarize_metrics(analysis_metrics: dict, candidate_seconds: dict, wall_time: float, search_time: float, nb_slowest: int = 20):
+    """Summarize the metrics of an analysis, with the busy and idle time of the workers and the slowest entries.
+
+    Args:
+        analysis_metrics (dict): metrics of the tasks merged by merge_metrics, and keys of the candidates searched for each entry
+        candidate_seconds (dict): search time of each candidate key, only known for the search entry by entry
+        wall_time (float): duration of the analysis in seconds
+        search_time (float): time spent waiting for the tasks in seconds
+        nb_slowest (int): number of slowest entries reported
+
+    Returns:
+        dict: metrics summary
+    """
+    timers = dict(metrics["timers"])
+    counters = dict(metrics["counters"])
+    for kind, values in (("timers", timers), ("counters", counters)):
+        for name, value in analysis_metrics[kind].items():
+            values[name] = values.get(name, 0) + value
+
+    workers = {worker: dict(values, idle=max(search_time - values["busy"], 0)) for worker, values in analysis_metrics["workers"].items()}
+    entries_seconds = {entry_name: sum(candidate_seconds.get(candidate_key, 0) for candidate_key in candidate_keys) for entry_name, candidate_keys in analysis_metrics["candidates"].items()}
+    slowest_entries = sorted(entries_seconds.items(), key=lambda entry: entry[1], reverse=True)[:nb_slowest]
+    return {"wall_time": wall_time,
+            "timers": timers,
+            "counters": counters,
+            "workers": workers,
+            "slowest_entries": [{"entry": entry_name, "seconds": seconds} for entry_name, seconds in slowest_entries if seconds > 0]}
+
+def create_pool(nb_processes: int):
+    """Create a pool of processes, which can be used for several analyses.
+
+    Args:
+        nb_processes (int): number of processes
+
+    Returns:
+        ProcessPoolExecutor: pool of processes, to be stopped with stop_pool
+    """
+    return ProcessPoolExecutor(max_workers=nb_processes)
+
+def stop_pool(pool: ProcessPoolExecutor, terminate: bool = False):
+    """Stop a pool of processes, cancelling the tasks not started yet.
+
+    Args:
+        pool (ProcessPoolExecutor): pool of processes
+        terminate (bool): kill the processes instead of waiting for their running tasks, after a failure or a timeout
+    """
+    if terminate:
+        # A running task cannot be cancelled, so its process is killed instead of being waited for, a failed or stuck task holding
+        # the analysis otherwise: with terminate_workers from Python 3.14, and before with the private processes of the executor
+        if hasattr(pool, "terminate_workers"):
+            pool.terminate_workers()
+        else:
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.terminate()
+    pool.shutdown(wait=True, cancel_futures=True)
+
+def complete_tasks(futures: list, timeout: float = None):
+    """Wait for the tasks submitted to a pool of processes, raising the first exception of a task.
+
+    The future of a task is removed from the futures once its result is yielded, so that the result is released as soon as the caller drops it.
+
+    Args:
+        futures (list): futures of the tasks, replaced by None once completed
+        timeout (float): maximal time in seconds to wait for a task to complete, None to wait forever
+
+    Yields:
+        tuple: index of a completed task in the futures and its result, in the order of completion
+    """
+    indexes = {future: id for id, future in enumerate(futures)}
+    pending = set(futures)
+    done = []
+    try:
+        for _ in tqdm(range(len(futures))):
+            if len(done) == 0:
+                done, pending = wait(pending, timeout, FIRST_COMPLETED)
+                if len(done) == 0:
+                    raise TimeoutError(f"No task completed in {timeout} seconds")
+                done = list(done)
+            future = done.pop()
+            id = indexes.pop(future)
+            futures[id] = None
+            yield id, future.result()
+    except BaseException:
+        for future in futures:
+            if future is not None:
+                future.cancel()
+        raise
+
+def gather_tasks(futures: list, timeout: float = None):
+    """Wait for all the tasks submitted to a pool of processes, raising the first exception of a task.
+
+    Args:
+        futures (list): futures of the tasks
+        timeout (float): maximal time in seconds to wait for a task to complete, None to wait forever
+
+    Returns:
+        list: results of the tasks, in the order of the futures
+    """
+    results = [None for _ in futures]
+    for id, result in complete_tasks(futures, timeout):
+        results[id] = result
+    return results
+
+def submit_chunk_tasks(pool: ProcessPoolExecutor, shared_index: dict, parameters: dict, chunk: list, nb_shards: int, tasks: list, futures: list):
+    """Check the off-targets of a chunk of sequences, the genome being split into shards searched in parallel.
+
+    Args:
+        pool (ProcessPoolExecutor): pool of processes
+        shared_index (dict): description of the shared reference index, see share_reference_index
+        parameters (dict): identification parameters
+        chunk (list): list of the sequences searched
+        nb_shards (int): number of shards of the genome, see get_shard_ranges
+        tasks (list): strand (None), sequences, first task and number of shards of each task, the submitted tasks being appended
+        futures (list): futures of the tasks, the submitted tasks being appended
+    """
+    first = len(tasks)
+    for shard in range(nb_shards):
+        tasks.append((None, chunk, first, nb_shards))
+        futures.append(pool.submit(run_task, shared_index, parameters, process_chunk, (chunk, (shard, nb_shards) if nb_shards > 1 else None)))
+
+def gather_chunk_results(tasks: list, id: int, task_results: list, sharded_results: dict):
+    """Gather the off-targets of a chunk of sequences, concatenating the ones of its shards in order once they are all searched.
+
+    Args:
+        tasks (list): tasks submitted, see submit_chunk_tasks
+        id (int): index of the completed task
+        task_results (list): off-targets on the coding and the complementary strands of each sequence of the task
+        sharded_results (dict): results of the completed shards of each chunk, by index of its first task
+
+    Returns:
+        list: off-targets on the coding and the complementary strands of each sequence of the chunk, None while shards of the chunk are searched
+    """
+    _, chunk, first, nb_shards = tasks[id]
+    if nb_shards == 1:
+        return task_results
+    shards = sharded_results.setdefault(first, {})
+    shards[id - first] = task_results
+    if len(shards) < nb_shards:
+        return None
+    del sharded_results[first]
+    return [tuple([off_target for shard in range(nb_shards) for off_target in shards[shard][j][k]] for k in (0, 1)) for j in range(len(chunk))]
+
+def submit_batch_tasks(pool: ProcessPoolExecutor, shared_index: dict, parameters: dict, sequences: list, pams: list, nb_contigs: int, nb_processes: int, tasks: list, futures: list):
+    """Check the off-targets of the sequences in a single sweep of each strand of each contig per PAM, the sequences of a PAM being split between the processes.
+
+    When a PAM has fewer sequences than processes, each strand is split into shards swept in parallel, see get_shard_ranges.
+
+    Args:
+        pool (ProcessPoolExecutor): pool of processes
+        shared_index (dict): description of the shared reference index, see share_reference_index
+        parameters (dict): identification parameters
+        sequences (list): list of the sequences searched
+        pams (list): list of PAM sequences
+        nb_contigs (int): number of contigs of the reference index
+        nb_processes (int): number of processes
+        tasks (list): strand, sequences and first task of the sweep of each task, the submitted tasks being appended
+        futures (list): futures of the tasks, the submitted tasks being appended
+    """
+    first = len(tasks)
+    groups = {pam: [group for group in ([j for j, sequence in enumerate(sequences) if sequence["pam"] == pam][k::nb_processes] for k in range(nb_processes)) if len(group) > 0] for pam in pams}
+    for contig in range(nb_contigs):
+        for strand in ("coding", "complementary"):
+            for pam in pams:
+                if len(groups[pam]) == 0:
+                    continue
+                nb_shards = genome_shards if genome_shards is not None else -(-nb_processes // len(groups[pam]))
+                for group in groups[pam]:
+                    group_sequences = [sequences[j] for j in group]
+                    for shard in range(nb_shards):
+                        tasks.append((strand, group_sequences, first))
+                        futures.append(pool.submit(run_task, shared_index, parameters, process_batch, (contig, strand, group_sequences, (shard, nb_shards) if nb_shards > 1 else None)))
+
+def gather_batch_results(sequences: list, tasks: list, batch_results: dict, results: dict):
+    """Gather the off-targets of the single sweeps in the order of the contigs.
+
+    Args:
+        sequences (list): list of the sequences searched
+        tasks (list): strand and sequences of each task, in the order of the contigs and the shards
+        batch_results (dict): off-targets of the sequences of each single sweep task searching them
+        results (dict): off-targets on the coding and the complementary strands of each candidate key, completed with the searched sequences
+    """
+    for sequence in sequences:
+        results[get_candidate_key(sequence)] = ([], [])
+    for id in sorted(batch_results):
+        strand, task_sequences = tasks[id][:2]
+        for sequence, sequence_off_targets in zip(task_sequences, batch_results[id]):
+            results[get_candidate_key(sequence)][0 if strand == "coding" else 1].extend(sequence_off_targets)
+
+# Reference indexes attached by a worker process, kept from one task to the next from the least to the most recently used, and profile of the worker
+attached_references = {}
+worker_profile = {}
+
+def run_task(shared_index, parameters, function, args):
+    """Run a task in a worker process on a shared reference index, attached at the first task of each analysis.
+
+    The worker keeps the parameters["attached_references"] most recently used reference indexes attached, only the
+    last one by default, so that a service alternating between several genomes does not attach them at each task.
+
+    Args:
+        shared_index (dict): description of the shared reference index, see share_reference_index
+        parameters (dict): identification parameters
+        function (function): function of the task, called with the reference index, the parameters and the arguments
+        args (tuple): arguments of the task
+
+    Returns:
+        value returned by the function
+        dict: metrics of the task with the worker process id and its busy time, None if the metrics are not collected
+    """
+    global collect_metrics
+    collect_metrics = parameters.get("collect_metrics", False)
+    start = time.perf_counter()
+    name = shared_index["name"]
+    if name in attached_references:
+        attached_references[name] = attached_references.pop(name)
+    else:
+        # Release the reference indexes of the previous analyses
+        while len(attached_references) >= parameters.get("attached_references", 1):
+            shared_memory = attached_references.pop(next(iter(attached_references)))["shared_memory"]
+            shared_memory.close()
+        reference_index, shared_memory = attach_reference_index(shared_index)
+        attached_references[name] = {"reference_index": reference_index, "shared_memory": shared_memory}
+        worker_profile.clear()
+
+    # The profile of the worker is saved after each task, as the worker does not know when the analysis ends, and restarted with each analysis
+    profile_path = parameters.get("profile_path")
+    if profile_path is not None:
+        if "profile" not in worker_profile:
+            worker_profile["profile"] = cProfile.Profile()
+        worker_profile["profile"].enable()
+    try:
+        result = function(attached_references[name]["reference_index"], parameters, *args)
+    finally:
+        if profile_path is not None:
+            worker_profile["profile"].disable()
+            worker_profile["profile"].dump_stats(f"{profile_path}.{os.getpid()}")
+
+    if not collect_metrics:
+        return result, None
+    task_metrics = reset_metrics()
+    task_metrics.update(worker=os.getpid(), busy=time.perf_counter() - start)
+    return result, task_metrics
+
+def get_off_target_location(off_target, strand, contig_sizes):
+    """Get the location of an off-target on the coding strand coordinates of its contig.
+
+    Args:
+        off_target (dict): off-target
+        strand (str): strand of the genome on which the off-target was found
+        contig_sizes (dict): size of each contig of the genome
+
+    Returns:
+        str: name of the contig
+        int: start of the off-target
+        int: end of the off-target
+    """
+    contig = off_target.get("contig", next(iter(contig_sizes)))
+    if strand == "coding":
+        return contig, off_target["index"][0], off_target["index"][1]
+    return contig, contig_sizes[contig] - off_target["index"][0], contig_sizes[contig] - off_target["index"][1]
+
+def score_candidate(sequence, off_targets, CI_off_targets):
+    """Score the specificity of a possible sequence from its off-targets on both strands of the genome.
+
+    The first exact replica is the target itself, the other replicas count as off-targets. Each off-target
+    lowers the score by its concordance relative to the length of the protospacer, a sequence without any
+    off-target scoring 100.
+
+    Args:
+        sequence (dict): sequence dict
+        off_targets (list): off-targets of the sequence on the coding strand of the genome
+        CI_off_targets (list): off-targets of the sequence on the complementary strand of the genome
+
+    Returns:
+        int: number of off-targets
+        float: specificity score, between 0 and 100
+    """
+    protospacer_length = len(sequence["sequence"]) - 3
+    nb_replicas = 0
+    nb_off_targets = 0
+    weight = 0
+    for off_target in off_targets + CI_off_targets:
+        if off_target["sequence"] == sequence["sequence"]:
+            nb_replicas += 1
+            if nb_replicas == 1:
+                continue
+        nb_off_targets += 1
+        weight += min(off_target["concordance"] / protospacer_length, 1)
+    return nb_off_targets, round(100 / (1 + weight), 2)
+
+def screen_entry(sequences, off_targets, CI_off_targets, off_target_budget, top_candidates):
+    """Screen the possible sequences of a FASTA entry, discarding the ones over the off-target budget and ranking the others by specificity.
+
+    Args:
+        sequences (list): list of the possible sequences
+        off_targets (list): off-targets of each sequence on the coding strand of the genome
+        CI_off_targets (list): off-targets of each sequence on the complementary strand of the genome
+        off_target_budget (int): maximal number of off-targets of a sequence, None to keep all the sequences
+        top_candidates (int): number of sequences kept, None to keep all of them
+
+    Returns:
+        list: kept sequences, from the most to the least specific
+        list: off-targets of each kept sequence on the coding strand of the genome
+        list: off-targets of each kept sequence on the complementary strand of the genome
+        list: specificity score of each kept sequence
+    """
+    ranking = []
+    for j, sequence in enumerate(sequences):
+        nb_off_targets, score = score_candidate(sequence, off_targets[j], CI_off_targets[j])
+        if off_target_budget is None or nb_off_targets <= off_target_budget:
+            ranking.append((score, j))
+    ranking.sort(key=lambda candidate: -candidate[0])
+    if top_candidates is not None:
+        ranking = ranking[:top_candidates]
+    return [sequences[j] for _, j in ranking], [off_targets[j] for _, j in ranking], [CI_off_targets[j] for _, j in ranking], [score for score, _ in ranking]
+
+def report_entry(entry_name, sequences, off_targets, CI_off_targets, contig_sizes, scores = None):
+    """Write the report of a FASTA entry.
+
+    Args:
+        entry_name (str): name of the entry
+        sequences (list): list of the possible sequences
+        off_targets (list): off-targets of each sequence on the coding strand of the genome
+        CI_off_targets (list): off-targets of each sequence on the complementary strand of the genome
+        contig_sizes (dict): size of each contig of the genome, the contig of the off-targets is reported if there are several
+        scores (list): specificity score of each sequence in screening mode, see score_candidate
+
+    Returns:
+        str: report of the entry
+    """
+    def location(off_target, strand):
+        contig, start, end = get_off_target_location(off_target, strand, contig_sizes)
+        where = f"genome {strand} strand" if len(contig_sizes) == 1 else f"genome {strand} strand of {contig}"
+        return f"Index in {where}: {start} to {end}"
+
+    buffer = entry_name + "\n\n"
+    buffer += f"Number of potential targets found: {len(sequences)}\n\n"
+
+    for j, sequence in enumerate(sequences):
+        buffer += f"Target {j+1} on {sequence['deaminase_strand']} strand:\n"
+
+        if sequence["deaminase_strand"] == "coding":
+            buffer += f"    Sequence {j+1}: {sequence['sequence']}\n"
+            buffer += f"    PAM: {sequence['pam']}\n"
+            buffer += f"    Target: {sequence['target']}\n"
+            buffer += f"    Index in FASTA sample: {sequence['index']}\n\n"
+        else:
+            buffer += f"    Sequence {j+1}: {get_CI_sequence(sequence['sequence'])} ({sequence['sequence']})\n"
+            buffer += f"    PAM: {get_CI_sequence(sequence['pam'])} ({sequence['pam']})\n"
+            buffer += f"    Target: {get_CI_sequence(sequence['target'])} ({sequence['target']})\n"
+            buffer += f"    Index in FASTA sample: {sequence['CI_index']} ({sequence['index']})\n\n"
+        if scores is not None:
+            buffer += f"    Specificity score: {scores[j]}\n\n"
+
+        replicas = [off_target for off_target in off_targets[j] if off_target["sequence"] == sequence["sequence"]]
+        sequence_off_targets = [off_target for off_target in off_targets[j] if off_target["sequence"] != sequence["sequence"]]
+        CI_replicas = [CI_off_target for CI_off_target in CI_off_targets[j] if CI_off_target["sequence"] == sequence["sequence"]]
+        sequence_CI_off_targets = [CI_off_target for CI_off_target in CI_off_targets[j] if CI_off_target["sequence"] != sequence["sequence"]]
+
+        buffer += f"    Number of exact replica: {len(replicas) + len(CI_replicas)}\n\n"
+        for replica in replicas:
+            buffer += f"        {location(replica, 'coding')}\n"
+        for CI_replica in CI_replicas:
+            buffer += f"        {location(CI_replica, 'complementary')}\n"
+        buffer += "\n"
+        
+        buffer += f"    Number of off-targets: {len(sequence_off_targets) + len(sequence_CI_off_targets)}\n\n"
+        for off_target in sequence_off_targets:
+            buffer += f"        Off-target sequence: {off_target['sequence']}\n"
+            buffer += f"        Concordance: {off_target['concordance']}\n"
+            buffer += f"        {location(off_target, 'coding')}\n\n"
+        for CI_off_target in sequence_CI_off_targets:
+            buffer += f"        Off-target sequence: {CI_off_target['sequence']}\n"
+            buffer += f"        Concordance: {CI_off_target['concordance']}\n"
+            buffer += f"        {location(CI_off_target, 'complementary')}\n\n"
+
+    buffer += "---------------------------------------------\n\n"
+
+    return buffer
+
+def search_contigs(sequence, reference_index, strand, parameters, max_off_targets = None, shard = None):
+    """Search the off-targets of a sequence on one strand of every contig, tagging them with the name of their contig.
+
+    Args:
+        sequence (dict): sequence dict
+        reference_index (dict): reference index, see build_reference_index
+        strand (str): "coding" or "complementary"
+        parameters (dict): identification parameters
+        max_off_targets (int): the search stops as soon as more off-targets are found, None to find all of them
+        shard (tuple): index and number of shards of the genome, only the sites of this shard being searched, see get_shard_ranges
+
+    Returns:
+        list: list of off-targets
+    """
+    off_targets = []
+    site_ranges = get_shard_ranges([genome_index["size"] for genome_index in reference_index["contigs"]], *shard) if shard is not None else [None] * len(reference_index["contigs"])
+    for genome_index, site_range in zip(reference_index["contigs"], site_ranges):
+        if max_off_targets is not None and len(off_targets) > max_off_targets:
+            break
+        if site_range is not None and site_range[0] == site_range[1]:
+            continue
+        for off_target in search_off_target(sequence, genome_index[strand], parameters["concordance_threshold"], parameters["allowed_mismatches"], parameters["allowed_gaps"],
+                                            max_off_targets - len(off_targets) if max_off_targets is not None else None, site_range):
+            off_target["contig"] = genome_index["name"]
+            off_targets.append(off_target)
+    return off_targets
+
+def get_search_limit(parameters):
+    """Get the number of off-targets beyond which the search of a sequence stops in screening mode, the first exact replica being the target itself.
+
+    Args:
+        parameters (dict): identification parameters
+
+    Returns:
+        int: maximal number of off-targets searched, None to find all of them
+    """
+    off_target_budget = parameters.get("off_target_budget")
+    return off_target_budget + 1 if off_target_budget is not None else None
+
+def process_chunk(reference_index, parameters, sequences, shard = None):
+    max_off_targets = get_search_limit(parameters)
+    results = []
+    for sequence in sequences:
+        start = time.perf_counter()
+        off_targets = search_contigs(sequence, reference_index, "coding", parameters, max_off_targets, shard)
+        if max_off_targets is not None and len(off_targets) > max_off_targets:
+            CI_off_targets = []
+        else:
+            CI_off_targets = search_contigs(sequence, reference_index, "complementary", parameters, max_off_targets - len(off_targets) if max_off_targets is not None else None, shard)
+        results.append((off_targets, CI_off_targets))
+        if collect_metrics:
+            metrics.setdefault("candidates", []).append(time.perf_counter() - start)
+    return results
+
+def process_batch(reference_index, parameters, contig, strand, sequences, shard = None):
+    genome_index = reference_index["contigs"][contig]
+    site_range = get_shard_ranges([genome_index["size"]], *shard)[0] if shard is not None else None
+    batch_off_targets = search_off_target_batch(sequences, genome_index[strand], parameters["concordance_threshold"], parameters["allowed_mismatches"], parameters["allowed_gaps"], get_search_limit(parameters), site_range)
+    for off_targets in batch_off_targets:
+        for off_target in off_targets:
+            off_target["contig"] = genome_index["name"]
+    return batch_off_targets
+
+if __name__ == "__main__":
+
+    # One pool of processes for all the repositories
+    pool = create_pool(nb_processes)
+    failed = True
+    try:
+        for dir in os.listdir("data/"):
+            dir_path = os.path.join("data", dir)
+        
+            if os.path.isdir(dir_path):
+                results_files = [file for file in os.listdir(dir_path) if file.startswith("results_") and not file.endswith(".sweep.tsv")]
+                fasta_files = [file for file in os.listdir(dir_path) if file.endswith(FASTA_EXTENSIONS)]
+                genome_files = [file for file in os.listdir(dir_path) if file.endswith(GENOME_EXTENSIONS)]
+            
+                # Repository already analysed, the checkpoints only analyse the new or modified entries again
+                if len(results_files) > 0 and not checkpoint_runs and not parameter_sweep:
+                    continue
+
+                # Check if the repository is correctly formatted
+                if len(fasta_files) != 1 or len(genome_files) != 1:
+                    print(f"The repository {dir_path} should contain exactly one .fasta(.gz) file and one .fa(.gz) file !")
+                    break
+
+                print(f"Analyzing {dir}...")
+                t_start = time.time()
+                if parameter_sweep:
+                    configurations = get_sweep_configurations(parameter_sweep, {"targets": targets, "pams": pams, "deaminase_window": deaminase_window, "concordance_threshold": concordance_threshold,
+                                                                                "allowed_mismatches": allowed_mismatches, "allowed_gaps": allowed_gaps})
+                    sweep_fasta_file(dir_path, fasta_files[0], genome_files[0], True, configurations, nb_processes, pool)
+                else:
+                    analyse_fasta_file(dir_path, fasta_files[0], genome_files[0], True, targets, pams, deaminase_window, concordance_threshold, allowed_mismatches, nb_processes, batch_search, pool)
+                t_end = time.time()
+                print(f"{dir} analysed !")
+                print(f"Time taken: {round(t_end-t_start, 2)} seconds")
+        failed = False
+    finally:
+        stop_pool(pool, failed)
@@ -0,0 +1,451 @@
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import identifier
+from identifier import *
+
+# Parameters of the identification which can be set by a query, the other ones being set when the service starts
+QUERY_PARAMETERS = ("targets", "pams", "deaminase_window", "concordance_threshold", "allowed_mismatches", "allowed_gaps", "off_target_budget", "top_candidates")
+
+# Queries answered by the service, see handle_query
+QUERY_PATHS = ("/candidates", "/off_targets", "/identify")
+
+# Settings of the identifier module which can be set by the configuration of the service
+MODULE_SETTINGS = ("chunk_cost", "task_timeout", "max_seed_length", "index_cache_directory", "index_cache_size", "linear_contigs")
+
+def get_default_configuration():
+    """Get the default configuration of the service, from the parameters of the identifier module.
+
+    Returns:
+        dict: configuration of the service
+    """
+    configuration = {"genomes": {},
+                     "host": "127.0.0.1",
+                     "port": 8080,
+                     "socket": None,
+                     "nb_processes": nb_processes,
+                     "max_concurrency": 4,
+                     "queue_timeout": 30,
+                     "max_batch_size": 10000,
+                     "parameters": {"targets": targets, "pams": pams, "deaminase_window": deaminase_window, "concordance_threshold": concordance_threshold,
+                                    "allowed_mismatches": allowed_mismatches, "allowed_gaps": allowed_gaps, "off_target_budget": None, "top_candidates": None}}
+    configuration.update({name: getattr(identifier, name) for name in MODULE_SETTINGS})
+    return configuration
+
+def load_configuration(path: str = None, overrides: dict = None):
+    """Load the configuration of the service, the values of the configuration file and of the overrides replacing the default ones.
+
+    Args:
+        path (str): path of a JSON configuration file, None to use the default configuration
+        overrides (dict): values set on the command line, the None values being ignored
+
+    Returns:
+        dict: configuration of the service
+    """
+    configuration = get_default_configuration()
+    layers = []
+    if path is not None:
+        with open(path) as file:
+            layers.append(json.load(file))
+    if overrides is not None:
+        layers.append(overrides)
+
+    for layer in layers:
+        for name, value in layer.items():
+            if value is None:
+                continue
+            if name == "parameters":
+                for parameter, parameter_value in value.items():
+                    if parameter not in QUERY_PARAMETERS:
+                        raise ValueError(f"Unknown parameter {parameter}, expected one of {QUERY_PARAMETERS}")
+                    configuration["parameters"][parameter] = parameter_value
+            elif name == "genomes":
+                configuration["genomes"].update(value)
+            elif name in configuration:
+                configuration[name] = value
+            else:
+                raise ValueError(f"Unknown setting {name}")
+    return configuration
+
+def start_service(configuration: dict):
+    """Open the genomes of the service and start its pool of processes, each process attaching every genome once.
+
+    Args:
+        configuration (dict): configuration of the service, see load_configuration
+
+    Returns:
+        dict: opened genomes, pool of processes, parameters of the identification and limits of the service, to be stopped with stop_service
+    """
+    if len(configuration["genomes"]) == 0:
+        raise ValueError("The service needs at least one genome")
+    for name in MODULE_SETTINGS:
+        setattr(identifier, name, configuration[name])
+
+    parameters = dict(configuration["parameters"])
+    seed_length = get_seed_length(parameters["concordance_threshold"], parameters["allowed_mismatches"], parameters["allowed_gaps"])
+    service = {"references": {},
+               "pool": None,
+               "nb_processes": configuration["nb_processes"],
+               "parameters": parameters,
+               "semaphore": threading.BoundedSemaphore(configuration["max_concurrency"]),
+               "queue_timeout": configuration["queue_timeout"],
+               "max_batch_size": configuration["max_batch_size"]}
+    try:
+        for name, path in configuration["genomes"].items():
+            service["references"][name] = open_reference(path, parameters["pams"], seed_length)
+        parameters["attached_references"] = len(service["references"])
+
+        # Warm the processes up, attaching the genomes before the first query
+        service["pool"] = create_pool(service["nb_processes"])
+        gather_tasks([service["pool"].submit(run_task, reference["shared_index"], parameters, process_chunk, ([],))
+                      for reference in service["references"].values() for _ in range(service["nb_processes"])])
+    except BaseException:
+        stop_service(service)
+        raise
+    return service
+
+def stop_service(service: dict):
+    """Stop the pool of processes of the service and release its genomes.
+
+    Args:
+        service (dict): service, see start_service
+    """
+    if service["pool"] is not None:
+        stop_pool(service["pool"])
+    for reference in service["references"].values():
+        close_reference(reference)
+
+def get_query_parameters(service: dict, query: dict):
+    """Get the parameters of a query, the parameters of the service being replaced by the ones of the query.
+
+    Args:
+        service (dict): service, see start_service
+        query (dict): query
+
+    Returns:
+        dict: identification parameters of the query
+    """
+    query_parameters = query.get("parameters", {})
+    if not isinstance(query_parameters, dict):
+        raise ValueError("The parameters of the query should be a JSON object")
+    parameters = dict(service["parameters"])
+    for name, value in query_parameters.items():
+        if name not in QUERY_PARAMETERS:
+            raise ValueError(f"Unknown parameter {name}, expected one of {QUERY_PARAMETERS}")
+        parameters[name] = value
+
+    # The values of the parameters are checked before the search, which would fail on them with an internal error
+    if not isinstance(parameters["targets"], list) or not all(isinstance(target, list) and len(target) == 3 and isinstance(target[0], str) and len(target[0]) == 3
+                                                              and target[1] in (0, 1, 2) and target[2] in ("coding", "complementary") for target in parameters["targets"]):
+        raise ValueError("The targets should be a list of [codon, index of the target nucleotide, strand]")
+    if not isinstance(parameters["pams"], list) or not all(isinstance(pam, str) and len(pam) >= 3 for pam in parameters["pams"]):
+        raise ValueError("The PAMs should be a list of sequences of at least 3 nucleotides")
+    if not isinstance(parameters["deaminase_window"], list) or len(parameters["deaminase_window"]) != 2 or not all(isinstance(bound, int) for bound in parameters["deaminase_window"]):
+        raise ValueError("The deaminase window should be a list of 2 integers")
+    for name in ("concordance_threshold", "allowed_mismatches", "allowed_gaps", "off_target_budget", "top_candidates"):
+        if parameters[name] is None and name in ("off_target_budget", "top_candidates"):
+            continue
+        if not isinstance(parameters[name], int) or parameters[name] < 0:
+            raise ValueError(f"The parameter {name} should be a non-negative integer")
+    return parameters
+
+def get_query_reference(service: dict, query: dict):
+    """Get the genome of a query, the first genome of the service by default.
+
+    Args:
+        service (dict): service, see start_service
+        query (dict): query
+
+    Returns:
+        dict: opened genome, see open_reference
+    """
+    name = query.get("genome", next(iter(service["references"])))
+    if not isinstance(name, str) or name not in service["references"]:
+        raise ValueError(f"Unknown genome {name}, expected one of {list(service['references'])}")
+    return service["references"][name]
+
+def get_query_items(service: dict, query: dict, key: str, fields: tuple):
+    """Get the entries or the guides of a query, a batch being limited to max_batch_size items.
+
+    Args:
+        service (dict): service, see start_service
+        query (dict): query
+        key (str): "entries" or "guides"
+        fields (tuple): text fields required in each item
+
+    Returns:
+        list: items of the query
+    """
+    items = query.get(key)
+    if not isinstance(items, list):
+        raise ValueError(f"The query should contain a list of {key}")
+    if len(items) > service["max_batch_size"]:
+        raise OverflowError(f"The query contains {len(items)} {key}, more than the limit of {service['max_batch_size']}")
+    for item in items:
+        if not isinstance(item, dict) or not all(isinstance(item.get(field), str) for field in fields):
+            raise ValueError(f"The {key} should be objects with the text fields {list(fields)}")
+    return items
+
+def get_guide_sequence(guide: dict, pams: list):
+    """Get the sequence dict of a guide, its PAM being the first PAM matching its last nucleotides if not given.
+
+    Args:
+        guide (dict): sequence of the guide, followed by its PAM, and optionally the PAM
+        pams (list): list of PAM sequences
+
+    Returns:
+        dict: sequence dict
+    """
+    sequence = guide["sequence"].upper()
+    pam = guide.get("pam")
+    if len(sequence) <= 3:
+        raise ValueError(f"The guide {sequence} should be a protospacer followed by its PAM")
+    if pam is not None and not isinstance(pam, str):
+        raise ValueError(f"The PAM of the guide {sequence} should be a sequence")
+    if pam is None:
+        pam = next((pam for pam in pams if get_pam_pattern(pam[:3]).fullmatch(sequence[-3:])), None)
+        if pam is None:
+            raise ValueError(f"The guide {sequence} does not end with any of the PAMs {pams}")
+    return {"index": None, "CI_index": None, "target": sequence[:3], "pam": pam, "sequence": sequence, "deaminase_strand": "coding"}
+
+def check_query(service: dict, path: str, query: dict):
+    """Check a query before it is answered, the invalid queries raising ValueError or OverflowError and the unknown ones LookupError.
+
+    Args:
+        service (dict): service, see start_service
+        path (str): path of the query
+        query (dict): content of the query
+
+    Returns:
+        dict: parameters of the query, its genome and its entries or guides
+    """
+    if path not in QUERY_PATHS:
+        raise LookupError(f"Unknown query {path}")
+    checked = {"parameters": get_query_parameters(service, query)}
+    if path != "/candidates":
+        checked["reference"] = get_query_reference(service, query)
+    if path == "/off_targets":
+        checked["guides"] = [get_guide_sequence(guide, checked["parameters"]["pams"]) for guide in get_query_items(service, query, "guides", ("sequence",))]
+    else:
+        checked["entries"] = [(entry["name"], entry["sequence"].upper()) for entry in get_query_items(service, query, "entries", ("name", "sequence"))]
+    return checked
+
+def run_query(service: dict, path: str, checked: dict):
+    """Search the candidates or the off-targets of a query checked by check_query.
+
+    Args:
+        service (dict): service, see start_service
+        path (str): path of the query
+        checked (dict): checked query, see check_query
+
+    Returns:
+        dict: answer of the query
+    """
+    parameters = checked["parameters"]
+
+    if path == "/candidates":
+        finder = compile_candidate_finder(parameters["targets"], parameters["pams"], parameters["deaminase_window"])
+        return {"entries": [{"name": name, "candidates": find_candidates(finder, sequence)} for name, sequence in checked["entries"]]}
+
+    if path == "/off_targets":
+        reference = checked["reference"]
+        guides = checked["guides"]
+        results = search_sequences(reference, guides, parameters, service["pool"], service["nb_processes"])
+        answer = []
+        for guide, (off_targets, CI_off_targets) in zip(guides, results):
+            record = get_entry_records("", [guide], [off_targets], [CI_off_targets], reference["contig_sizes"], [score_candidate(guide, off_targets, CI_off_targets)[1]])[0]
+            answer.append({key: record[key] for key in ("sequence", "pam", "specificity", "replicas", "off_targets")})
+        return {"guides": answer}
+
+    entries = checked["entries"]
+    records = identify_entries(checked["reference"], entries, parameters, service["pool"], service["nb_processes"])
+    return {"entries": [{"name": name, "candidates": entry_records} for (name, _), entry_records in zip(entries, records)]}
+
+def handle_query(service: dict, path: str, query: dict):
+    """Answer a query of the service.
+
+    The queries are:
+        /candidates: possible sequences of the entries {"entries": [{"name": ..., "sequence": ...}]}
+        /off_targets: off-targets of the guides on a genome {"genome": ..., "guides": [{"sequence": ..., "pam": ...}]}
+        /identify: possible sequences of the entries and their off-targets on a genome {"genome": ..., "entries": [...]}
+    Every query may replace the parameters of the service with {"parameters": {...}}, see QUERY_PARAMETERS.
+
+    Args:
+        service (dict): service, see start_service
+        path (str): path of the query
+        query (dict): content of the query
+
+    Returns:
+        dict: answer of the query
+    """
+    return run_query(service, path, check_query(service, path, query))
+
+def answer_query(service: dict, path: str, content: bytes):
+    """Answer the content of a POST request, the queries beyond the concurrency limit waiting for queue_timeout seconds.
+
+    Args:
+        service (dict): service, see start_service
+        path (str): path of the query
+        content (bytes): JSON content of the query, an empty content being an empty query
+
+    Returns:
+        tuple: HTTP status and answer of the query, an error message if the query failed
+    """
+    try:
+        query = json.loads(content or b"{}")
+    except ValueError as error:
+        return 400, {"error": f"Invalid JSON: {error}"}
+    if not isinstance(query, dict):
+        return 400, {"error": "The query should be a JSON object"}
+
+    # The invalid queries are rejected before waiting for the concurrency limit, the errors of the search being internal errors
+    try:
+        checked = check_query(service, path, query)
+    except ValueError as error:
+        return 400, {"error": f"Invalid query: {error}"}
+    except LookupError as error:
+        return 404, {"error": str(error)}
+    except OverflowError as error:
+        return 413, {"error": str(error)}
+
+    if not service["semaphore"].acquire(timeout=service["queue_timeout"]):
+        return 503, {"error": "Too many concurrent queries"}
+    try:
+        start = time.perf_counter()
+        answer = run_query(service, path, checked)
+        answer["seconds"] = time.perf_counter() - start
+        return 200, answer
+    except TimeoutError as error:
+        return 504, {"error": str(error)}
+    except Exception as error:
+        return 500, {"error": f"Internal error: {error!r}"}
+    finally:
+        service["semaphore"].release()
+
+def get_status(service: dict):
+    """Get the status of the service.
+
+    Args:
+        service (dict): service, see start_service
+
+    Returns:
+        dict: genomes and their contigs, parameters and limits of the service
+    """
+    return {"genomes": {name: {"path": reference["path"], "contigs": reference["contig_sizes"]} for name, reference in service["references"].items()},
+            "parameters": {name: service["parameters"][name] for name in QUERY_PARAMETERS},
+            "nb_processes": service["nb_processes"],
+            "max_batch_size": service["max_batch_size"]}
+
+def create_handler(service: dict):
+    """Create the handler of the HTTP requests of a service.
+
+    Args:
+        service (dict): service, see start_service
+
+    Returns:
+        class: handler of the requests
+    """
+    class ServiceHandler(BaseHTTPRequestHandler):
+
+        def send_json(self, status: int, answer: dict):
+            content = json.dumps(answer).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def address_string(self):
+            # The clients of a Unix socket have no address
+            return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else "unix"
+
+        def do_GET(self):
+            if self.path != "/status":
+                self.send_json(404, {"error": f"Unknown query {self.path}"})
+                return
+            self.send_json(200, get_status(service))
+
+        def do_POST(self):
+            try:
+                content = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            except ValueError:
+                self.send_json(400, {"error": "Invalid Content-Length"})
+                return
+            self.send_json(*answer_query(service, self.path, content))
+
+    return ServiceHandler
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(service: dict, host: str = "127.0.0.1", port: int = 8080, socket_path: str = None):
+    """Serve the queries over HTTP, on a TCP port or on a Unix socket, until interrupted.
+
+    Args:
+        service (dict): service, see start_service
+        host (str): host of the TCP server
+        port (int): port of the TCP server
+        socket_path (str): path of the Unix socket, replacing the TCP server if given
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, create_handler(service))
+        print(f"Serving on {socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), create_handler(service))
+        server.daemon_threads = True
+        print(f"Serving on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Serve the deaminase target identifier, keeping the genomes indexed and the processes running between the queries.")
+    parser.add_argument("-c", "--config", help="JSON configuration file, see get_default_configuration")
+    parser.add_argument("-g", "--genome", action="append", default=[], help="genome served, as NAME=PATH, can be repeated")
+    parser.add_argument("--host", help="host of the HTTP server")
+    parser.add_argument("--port", type=int, help="port of the HTTP server")
+    parser.add_argument("--socket", help="Unix socket to serve on instead of a TCP port")
+    parser.add_argument("-p", "--processes", type=int, help="number of processes")
+    parser.add_argument("--max-concurrency", type=int, help="number of queries answered at the same time")
+    parser.add_argument("--queue-timeout", type=float, help="time in seconds a query waits beyond the concurrency limit before being rejected")
+    parser.add_argument("--max-batch-size", type=int, help="maximal number of entries or guides of a query")
+    parser.add_argument("--targets", type=json.loads, help='target codons as JSON, for instance [["CAG", 0, "coding"]]')
+    parser.add_argument("--pams", nargs="+", help="PAM sequences")
+    parser.add_argument("--deaminase-window", type=int, nargs=2, help="bounds of the deaminase window")
+    parser.add_argument("--concordance-threshold", type=int, help="threshold of concordance of an off-target")
+    parser.add_argument("--allowed-mismatches", type=int, help="number of mismatches allowed in an off-target")
+    parser.add_argument("--allowed-gaps", type=int, help="number of gaps allowed in an off-target")
+    args = parser.parse_args()
+
+    overrides = {"host": args.host,
+                 "port": args.port,
+                 "socket": args.socket,
+                 "nb_processes": args.processes,
+                 "max_concurrency": args.max_concurrency,
+                 "queue_timeout": args.queue_timeout,
+                 "max_batch_size": args.max_batch_size,
+                 "genomes": dict(genome.split("=", 1) for genome in args.genome),
+                 "parameters": {name: value for name, value in (("targets", args.targets), ("pams", args.pams), ("deaminase_window", args.deaminase_window),
+                                                                ("concordance_threshold", args.concordance_threshold), ("allowed_mismatches", args.allowed_mismatches),
+                                                                ("allowed_gaps", args.allowed_gaps)) if value is not None}}
+    configuration = load_configuration(args.config, overrides)
+
+    print(f"Loading {len(configuration['genomes'])} genomes...")
+    service = start_service(configuration)
+    try:
+        serve(service, configuration["host"], configuration["port"], configuration["socket"])
+    finally:
+        stop_service(service)
@@ -1,3 +1,15 @@
+import gc
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import weakref
+from concurrent.futures import Future
+
+import identifier
+import service
 from identifier import *
 
 if __name__ == "__main__":
@@ -151,3 +163,791 @@ if __name__ == "__main__":
     if complementary_search_test:
         print("All find_sequences complementary tests passed")    
 
+
+    ###############################################################
+
+    index_test = True
+
+    # Testing the PAM sites found on both strands, including the circular wrap
+    genome_test = "GGXXXXXXCAG123456789012345NGGXXXCAG123456789012345N"
+    genome_index = build_genome_index(genome_test, pams)
+    if list(genome_index["coding"]["pam_sites"]["NGG"]) != [26, 50]:
+        print("Test 23 failed")
+        index_test = False
+    if list(build_genome_index("XXTCCXXXXX", pams)["complementary"]["pam_sites"]["NGA"]) != [5]:
+        print("Test 24 failed")
+        index_test = False
+
+    # Testing the off-targets found with the index against the ones of the full scan of the genome
+    test_candidate["sequence"] = "CAG123456789012345NGG"
+    expected = [{"index": [5, 26], "concordance": 18, "sequence": "CAG123456789012345NGG", "mismatches": 0, "gaps": 0},
+                {"index": [29, 50], "concordance": 18, "sequence": "CAG123456789012345NGG", "mismatches": 0, "gaps": 0}]
+    if search_off_target(test_candidate, genome_index["coding"], 13, 1, 1) != expected or search_off_target(test_candidate, genome_index["complementary"], 13, 1, 1) != []:
+        print("Test 25 failed")
+        index_test = False
+
+    if index_test:
+        print("All genome index tests passed")
+
+    ###############################################################
+
+    seed_test = True
+
+    # Testing the split of the concordance threshold into seed blocks
+    if get_seed_blocks(13, 1, 1) != [(5, 5), (9, 4), (13, 4)] or get_seed_length(13, 1, 1) != 4:
+        print("Test 26 failed")
+        seed_test = False
+
+    # Testing the seeded off-target search against the off-targets of the full scan of the genome (index, sequence, concordance, mismatches and gaps)
+    test_candidate["sequence"] = "CAGTTACGATCGATCATGAGG"
+    genome_test = "ACGATCGATCATGTGGAACGTTACGATCGTTCATGAGGTTTCAGTTACGAT-CGATCATGAGGATC"
+    seed_index = build_genome_index(genome_test, pams, get_seed_length(13, 1, 1))
+    seed_expected = [([-7, 13], "G-T*ACGATCGATCATGTGG", 15, 1, 1), ([-5, 13], "T*ACGATCGATCATGTGG", 14, 1, 0), ([-7, 13], "G*T-ACGATCGATCATGTGG", 15, 1, 1),
+                     ([-5, 13], "T-ACGATCGATCATGTGG", 14, 0, 1), ([-3, 13], "ACGATCGATCATGTGG", 13, 0, 0), ([14, 35], "A-GTTACGATCG*TCATGAGG", 16, 1, 1),
+                     ([16, 35], "GTTACGATCG*TCATGAGG", 15, 1, 0), ([39, 60], "AGTTACGA-*CGATCATGAGG", 16, 1, 1), ([39, 60], "AGTTACGAT-CGATCATGAGG", 17, 0, 1)]
+    for strand, expected in (("coding", seed_expected), ("complementary", [])):
+        seed_sites = find_seed_sites(test_candidate, dict(seed_index[strand], pam_sites={}), 13, 1, 1)
+        if seed_sites is None or len(seed_sites) > len(seed_index[strand]["pam_sites"]["NGG"]):
+            print("Test 27 failed")
+            seed_test = False
+        found = search_off_target(test_candidate, seed_index[strand], 13, 1, 1)
+        if [(off_target["index"], off_target["sequence"], off_target["concordance"], off_target["mismatches"], off_target["gaps"]) for off_target in found] != expected:
+            print("Test 28 failed")
+            seed_test = False
+    if len(search_off_target(test_candidate, seed_index["coding"], 13, 1, 1)) != 9:
+        print("Test 29 failed")
+        seed_test = False
+
+    if seed_test:
+        print("All seed index tests passed")
+
+    ###############################################################
+
+    extension_test = True
+
+    # Testing several gaps in an off-target
+    test_candidate["sequence"] = "CAG123456789012345NGG"
+    genome_test = "345NGGXXXXXXXXXXXXXXXXXXNGGXXXCAG12345-678-9012"
+    if len(check_off_target(test_candidate, genome_test, 13, 0, 2)) != 1:
+        print("Test 30 failed")
+        extension_test = False
+
+    # Testing an alignment longer than the recursion limit
+    off_targets = []
+    step_off_target(off_targets, "ACGT"*1000, "ACGT"*1000, 4000, 3990, 1, 1, result="AGG")
+    if len(off_targets) != 1 or off_targets[0]["concordance"] != 4000:
+        print("Test 31 failed")
+        extension_test = False
+
+    if extension_test:
+        print("All off-target extension tests passed")
+
+    ###############################################################
+
+    batch_test = True
+
+    # Testing the single sweep against the off-targets of the full scan of the genome
+    genome_test = "ACGATCGATCATGTGGAACGTTACGATCGTTCATGAGGTTTCAGTTACGAT-CGATCATGAGGATC" + get_CI_sequence("CAGCTTACGATCGATCATGTGA")
+    batch_index = build_genome_index(genome_test, pams)
+    batch_candidates = [{"sequence": "CAGTTACGATCGATCATGAGG", "pam": "NGG"},
+                        {"sequence": "CAGCTTACGATCGTTCATGAGA", "pam": "NGA"},
+                        {"sequence": "CAGAGGAGATCCTCATGATCGTGG", "pam": "NGG"},
+                        {"sequence": "CAGTTAC", "pam": "NGG"}]
+    batch_expected = {"coding": [[([-8, 13], "AG-T*ACGATCGATCATGTGG", 16, 1, 1), ([-5, 13], "T*ACGATCGATCATGTGG", 14, 1, 0), ([-8, 13], "AG*T-ACGATCGATCATGTGG", 16, 1, 1)] + seed_expected[3:], [], [], []],
+                      "complementary": [[], [([-3, 19], "CAGCTTACGATCG*TCATGTGA", 18, 1, 0)], [], []]}
+    for strand, found in (("coding", 0), ("complementary", 1)):
+        batch_off_targets = search_off_target_batch(batch_candidates, batch_index[strand], 13, 1, 1)
+        if [[(off_target["index"], off_target["sequence"], off_target["concordance"], off_target["mismatches"], off_target["gaps"]) for off_target in off_targets] for off_targets in batch_off_targets] != batch_expected[strand]:
+            print("Test 32 failed")
+            batch_test = False
+        if len(batch_off_targets[found]) == 0 or len(batch_off_targets[3]) != 0:
+            print("Test 33 failed")
+            batch_test = False
+
+    if batch_test:
+        print("All batch search tests passed")
+
+    ###############################################################
+
+    encoding_test = True
+
+    # Testing the 2 bits encoding with ambiguous nucleotides
+    seq = "ACGTNNacgtRYACGTTGCA-X"
+    encoded = encode_sequence(seq)
+    if len(encoded["packed"]) != 6 or decode_sequence(encoded) != seq.upper():
+        print("Test 34 failed")
+        encoding_test = False
+    if decode_sequence(encoded, 3, 14) != seq.upper()[3:14]:
+        print("Test 35 failed")
+        encoding_test = False
+
+    # Testing the complementary inverse of an encoded sequence
+    if decode_sequence(get_CI_encoded(encoded)) != get_CI_sequence(seq).upper() or get_CI_sequence("ACGTNacgtn-") != "-nacgtNACGT":
+        print("Test 36 failed")
+        encoding_test = False
+
+    if encoding_test:
+        print("All sequence encoding tests passed")
+
+    ###############################################################
+
+    shared_test = True
+
+    # Testing the reference index attached from shared memory
+    seed_reference = {"pams": pams, "contigs": [dict(seed_index, name="test")]}
+    shared_memory, shared_index = share_reference_index(seed_reference)
+    attached_reference, attached_memory = attach_reference_index(shared_index)
+    attached_index = attached_reference["contigs"][0]
+    test_candidate["sequence"] = "CAGTTACGATCGATCATGAGG"
+    for strand, expected in (("coding", seed_expected), ("complementary", [])):
+        if attached_index[strand]["sequence"] != seed_index[strand]["sequence"] or attached_index[strand]["pam_sites"]["NGG"].tolist() != seed_index[strand]["pam_sites"]["NGG"].tolist():
+            print("Test 37 failed")
+            shared_test = False
+        found = search_off_target(test_candidate, attached_index[strand], 13, 1, 1)
+        if [(off_target["index"], off_target["sequence"], off_target["concordance"], off_target["mismatches"], off_target["gaps"]) for off_target in found] != expected:
+            print("Test 38 failed")
+            shared_test = False
+    del attached_index, attached_reference
+    attached_memory.close()
+    shared_memory.close()
+    shared_memory.unlink()
+
+    # Testing the runs of unknown nucleotides kept in the shared memory block, the tasks only carrying its name
+    genome_test = "ACGTN" + "N" * 10000 + "RYACGT-X" + "ACGT" * 10
+    shared_memory, shared_index = share_reference_index(build_reference_index([{"name": "test", "sequence": genome_test, "circular": True}], pams))
+    attached_reference, attached_memory = attach_reference_index(shared_index)
+    if shared_index != {"name": shared_memory.name}:
+        print("Test 83 failed")
+        shared_test = False
+    if attached_reference["contigs"][0]["coding"]["sequence"] != genome_test + "AC" or attached_reference["contigs"][0]["complementary"]["sequence"][:-2] != get_CI_sequence(genome_test):
+        print("Test 84 failed")
+        shared_test = False
+    del attached_reference
+    attached_memory.close()
+    shared_memory.close()
+    shared_memory.unlink()
+
+    if shared_test:
+        print("All shared genome index tests passed")
+
+    ###############################################################
+
+    cache_test = True
+
+    # Testing the reference index reloaded from the cache
+    with tempfile.TemporaryDirectory() as cache_directory:
+        genome_test = "ACGATCGATCATGTGGAACGTTACGATCGTTCATGAGGTTTCAGTTACGAT-CGATCATGAGGATC"
+        contigs_test = [{"name": "test", "sequence": genome_test, "circular": True}]
+        built_index = load_reference_index(contigs_test, pams, 4, cache_directory)["contigs"][0]
+        cached_index = load_reference_index(contigs_test, pams, 4, cache_directory)["contigs"][0]
+        if len(os.listdir(cache_directory)) != 1 or cached_index["coding"]["sequence"] != built_index["coding"]["sequence"]:
+            print("Test 39 failed")
+            cache_test = False
+        for strand, expected in (("coding", seed_expected), ("complementary", [])):
+            found = search_off_target(test_candidate, cached_index[strand], 13, 1, 1)
+            if [(off_target["index"], off_target["sequence"], off_target["concordance"], off_target["mismatches"], off_target["gaps"]) for off_target in found] != expected:
+                print("Test 40 failed")
+                cache_test = False
+
+        # Testing the eviction of the least recently used indexes
+        load_reference_index([dict(contigs_test[0], sequence=genome_test + "A")], pams, 4, cache_directory, 1)
+        if len(os.listdir(cache_directory)) != 1:
+            print("Test 41 failed")
+            cache_test = False
+        del cached_index
+
+        # Testing the removal of the indexes of the other versions of the format
+        stale_file = os.path.join(cache_directory, "0" * 64 + f".v{INDEX_VERSION - 1}.idx")
+        with open(stale_file, "wb") as file:
+            file.write(INDEX_MAGIC)
+        load_reference_index([dict(contigs_test[0], sequence=genome_test + "C")], pams, 4, cache_directory)
+        if os.path.exists(stale_file) or len(os.listdir(cache_directory)) != 2:
+            print("Test 85 failed")
+            cache_test = False
+
+    if cache_test:
+        print("All genome index cache tests passed")
+
+    ###############################################################
+
+    reader_test = True
+
+    # Testing the FASTA records wrapped over several lines, gzipped or not
+    with tempfile.TemporaryDirectory() as fasta_directory:
+        fasta_test = ">chromosome\nACGTACGT\nACGT\n\n>plasmid topology=linear\nGGCC\nAA\n"
+        with open(os.path.join(fasta_directory, "genome.fa"), "w") as file:
+            file.write(fasta_test)
+        with gzip.open(os.path.join(fasta_directory, "genome.fa.gz"), "wt") as file:
+            file.write(fasta_test)
+        for genome_file in ("genome.fa", "genome.fa.gz"):
+            if list(read_fasta(os.path.join(fasta_directory, genome_file))) != [(">chromosome", "ACGTACGTACGT"), (">plasmid topology=linear", "GGCCAA")]:
+                print("Test 42 failed")
+                reader_test = False
+
+        # Testing the topology of the contigs
+        contigs_test = read_genome(os.path.join(fasta_directory, "genome.fa.gz"), ["chromosome"])
+        if [(contig["name"], contig["circular"]) for contig in contigs_test] != [("chromosome", False), ("plasmid", False)]:
+            print("Test 43 failed")
+            reader_test = False
+        if not read_genome(os.path.join(fasta_directory, "genome.fa"))[0]["circular"]:
+            print("Test 44 failed")
+            reader_test = False
+
+    # Testing the off-targets overlapping the origin of a linear contig
+    test_candidate["sequence"] = "CAGTTACGATCGATCATGAGG"
+    genome_test = "AGGTTTTTTTTCAGTTACGATCGATCATG"
+    if len(search_off_target(test_candidate, build_genome_index(genome_test, pams)["coding"], 13, 1, 1)) != 1:
+        print("Test 45 failed")
+        reader_test = False
+    if len(search_off_target(test_candidate, build_genome_index(genome_test, pams, 4, False)["coding"], 13, 1, 1)) != 0:
+        print("Test 46 failed")
+        reader_test = False
+
+    if reader_test:
+        print("All FASTA reader tests passed")
+
+    ###############################################################
+
+    scheduler_test = True
+
+    # Testing the results of the tasks in order and the exceptions raised by a task
+    pool = create_pool(2)
+    if gather_tasks([pool.submit(pow, 2, k) for k in range(5)]) != [1, 2, 4, 8, 16]:
+        print("Test 47 failed")
+        scheduler_test = False
+    try:
+        gather_tasks([pool.submit(pow, 2, 1), pool.submit(int, "X")])
+        print("Test 48 failed")
+        scheduler_test = False
+    except ValueError:
+        pass
+
+    # Testing the results of the tasks released once consumed, the futures of the completed tasks being dropped
+    futures = [pool.submit(set, range(k)) for k in range(5)]
+    released = [weakref.ref(result) for _, result in complete_tasks(futures)]
+    if futures != [None] * 5 or any(result() is not None for result in released):
+        print("Test 98 failed")
+        scheduler_test = False
+    stop_pool(pool)
+
+    # Testing the processes of a pool killed instead of waiting for their running tasks
+    pool = create_pool(1)
+    gather_tasks([pool.submit(pow, 2, 1)])
+    future = pool.submit(time.sleep, 60)
+    while not future.running():
+        time.sleep(0.01)
+    stop_start = time.perf_counter()
+    stop_pool(pool, True)
+    if time.perf_counter() - stop_start > 30:
+        print("Test 101 failed")
+        scheduler_test = False
+    del future
+
+    # Testing the estimated cost of a search between the seeded sites and the PAM sites
+    test_candidate["sequence"] = "CAGTTACGATCGATCATGAGG"
+    for strand in ("coding", "complementary"):
+        cost = estimate_search_cost(test_candidate, seed_index[strand], 13, 1, 1)
+        if not len(find_seed_sites(test_candidate, seed_index[strand], 13, 1, 1) or []) <= cost <= len(seed_index[strand]["pam_sites"]["NGG"]):
+            print("Test 49 failed")
+            scheduler_test = False
+
+    if scheduler_test:
+        print("All scheduler tests passed")
+
+    ###############################################################
+
+    memo_test = True
+
+    # Testing the off-targets reloaded from the cache, for the same genome and parameters only
+    with tempfile.TemporaryDirectory() as cache_directory:
+        cache_file = os.path.join(cache_directory, "off_targets.db")
+        cache_parameters = {"concordance_threshold": 13, "allowed_mismatches": 1, "allowed_gaps": 1}
+        candidate_key = get_candidate_key(test_candidate)
+        cached_off_targets = (search_off_target(test_candidate, seed_index["coding"], 13, 1, 1), search_off_target(test_candidate, seed_index["complementary"], 13, 1, 1))
+        cache = open_off_target_cache(cache_file, "genome", cache_parameters)
+        store_off_targets(cache, {candidate_key: cached_off_targets})
+        close_off_target_cache(cache)
+        cache = open_off_target_cache(cache_file, "genome", cache_parameters)
+        if get_cached_off_targets(cache, candidate_key) != cached_off_targets:
+            print("Test 50 failed")
+            memo_test = False
+        close_off_target_cache(cache)
+        cache = open_off_target_cache(cache_file, "genome", dict(cache_parameters, allowed_mismatches=2))
+        if get_cached_off_targets(cache, candidate_key) is not None:
+            print("Test 51 failed")
+            memo_test = False
+        close_off_target_cache(cache)
+
+        # Testing the eviction of the least recently used off-targets
+        cache = open_off_target_cache(cache_file, "genome", cache_parameters, 1)
+        store_off_targets(cache, {("CAGTTACGATCGATCATGAGA", "NGA"): ([], [])})
+        if get_cached_off_targets(cache, candidate_key) is not None or get_cached_off_targets(cache, ("CAGTTACGATCGATCATGAGA", "NGA")) is not None:
+            print("Test 52 failed")
+            memo_test = False
+        close_off_target_cache(cache)
+
+        # Testing the incomplete searches of the screening mode, over the search limit and not stored
+        cache = open_off_target_cache(cache_file, "genome", cache_parameters)
+        store_off_targets(cache, {candidate_key: cached_off_targets, ("CAGTTACGATCGATCATGAGA", "NGA"): ([], [])}, 1)
+        if get_cached_off_targets(cache, candidate_key) is not None or get_cached_off_targets(cache, ("CAGTTACGATCGATCATGAGA", "NGA")) != ([], []):
+            print("Test 86 failed")
+            memo_test = False
+        close_off_target_cache(cache)
+
+    if memo_test:
+        print("All off-target cache tests passed")
+
+    ###############################################################
+
+    finder_test = True
+
+    # Testing the single pass over both strands against find_sequences target by target
+    seq = "ATGCAGCTTACGATCGATCATGTGGACAGTTTCAGTTACGATCGATCATGAGGTCCTCATGATCGTCACTGCTTACTGA"
+    finder = compile_candidate_finder([coding_target, coding_offset_target, complementary_target], pams, deaminase_window)
+    expected = find_sequences(seq, coding_target[0], coding_target[1], coding_target[2], pams, deaminase_window)
+    expected += find_sequences(seq, coding_offset_target[0], coding_offset_target[1], coding_offset_target[2], pams, deaminase_window)
+    expected += find_sequences(get_CI_sequence(seq), get_CI_sequence(complementary_target[0]), 2 - complementary_target[1], complementary_target[2], pams, deaminase_window)
+    if len(expected) == 0 or find_candidates(finder, seq) != expected:
+        print("Test 53 failed")
+        finder_test = False
+
+    # Testing the ambiguous nucleotides of a PAM
+    if [sequence["pam"] for sequence in find_candidates(compile_candidate_finder([coding_target], ["NRG", "NYG"], deaminase_window), "CAG123456789012NAGXCGX")] != ["NRG", "NYG"]:
+        print("Test 54 failed")
+        finder_test = False
+
+    if finder_test:
+        print("All candidate finder tests passed")
+
+    ###############################################################
+
+    output_test = True
+
+    # Testing the records of the replicas and off-targets in the coordinates of the coding strand
+    output_sequences = [{"index": 3, "CI_index": 20, "target": "CAG", "pam": "NGG", "sequence": "CAGTTACGATCGATCATGAGG", "deaminase_strand": "coding"}]
+    output_off_targets = [[{"sequence": "CAGTTACGATCGATCATGAGG", "concordance": 18, "index": [10, 31], "contig": "chromosome"}]]
+    output_CI_off_targets = [[{"sequence": "TTACGATCG*TCATGAGG", "concordance": 17, "index": [40, 58], "contig": "plasmid"}]]
+    contig_sizes = {"chromosome": 100, "plasmid": 60}
+    records = get_entry_records(">gene", output_sequences, output_off_targets, output_CI_off_targets, contig_sizes)
+    if records[0]["entry"] != "gene" or records[0]["replicas"] != [{"contig": "chromosome", "genome_strand": "coding", "start": 10, "end": 31}]:
+        print("Test 55 failed")
+        output_test = False
+    if records[0]["off_targets"][0]["start"] != 20 or records[0]["off_targets"][0]["end"] != 2:
+        print("Test 56 failed")
+        output_test = False
+
+    # Testing the result files, written only once the analysis is complete
+    with tempfile.TemporaryDirectory() as output_directory:
+        files = open_result_files(output_directory, "genes.fasta.gz", ["txt", "jsonl", "tsv"])
+        write_result_entry(files, ">gene", output_sequences, output_off_targets, output_CI_off_targets, contig_sizes)
+        if any(file.startswith("results_") for file in os.listdir(output_directory)):
+            print("Test 57 failed")
+            output_test = False
+        close_result_files(files, 1, 1, 1)
+        if sorted(os.listdir(output_directory)) != ["results_genes.jsonl", "results_genes.tsv", "results_genes.txt"]:
+            print("Test 58 failed")
+            output_test = False
+        with open(os.path.join(output_directory, "results_genes.tsv")) as file:
+            if len(file.readlines()) != 3:
+                print("Test 59 failed")
+                output_test = False
+        with open(os.path.join(output_directory, "results_genes.txt")) as file:
+            if not file.read().startswith("Number of KO: 1/1 - 100.0%"):
+                print("Test 60 failed")
+                output_test = False
+
+    # Testing the off-targets of a candidate kept until the last entry containing it is written
+    files = open_result_files(None, "genes.fasta", ["txt"], False)
+    output_entries = deque([(">gene", output_sequences, None), (">copy", output_sequences, None), (">other", [dict(output_sequences[0], sequence="CAGTTACGATCGATCATGAGA")], None)])
+    output_results = {get_candidate_key(output_sequences[0]): (output_off_targets[0], output_CI_off_targets[0]), ("CAGTTACGATCGATCATGAGA", "NGG"): None}
+    references = {get_candidate_key(output_sequences[0]): 2, ("CAGTTACGATCGATCATGAGA", "NGG"): 1}
+    if write_ready_entries(files, output_entries, output_results, contig_sizes, None, None, references) != (2, 2) or len(output_entries) != 1 or list(output_results) != [("CAGTTACGATCGATCATGAGA", "NGG")]:
+        print("Test 87 failed")
+        output_test = False
+    close_result_files(files, 0, 0, 0, True)
+
+    if output_test:
+        print("All result files tests passed")
+
+    ###############################################################
+
+    checkpoint_test = True
+
+    # Testing the entries reloaded from an interrupted run, for the same sequence and parameters only
+    with tempfile.TemporaryDirectory() as checkpoint_directory:
+        checkpoint_file = os.path.join(checkpoint_directory, get_checkpoint_name("genes.fasta"))
+        checkpoint_parameters = {"targets": [coding_target], "pams": pams, "deaminase_window": deaminase_window, "concordance_threshold": 13, "allowed_mismatches": 1, "allowed_gaps": 1}
+        checkpoint = open_checkpoint(checkpoint_file, "genome", checkpoint_parameters)
+        store_checkpoint_entry(checkpoint, get_entry_key(checkpoint, "ACGT"), output_sequences, output_off_targets, output_CI_off_targets)
+        close_checkpoint(checkpoint, False)
+        checkpoint = open_checkpoint(checkpoint_file, "genome", checkpoint_parameters)
+        if get_checkpoint_entry(checkpoint, get_entry_key(checkpoint, "ACGT")) != {"sequences": output_sequences, "off_targets": output_off_targets, "CI_off_targets": output_CI_off_targets}:
+            print("Test 61 failed")
+            checkpoint_test = False
+        if get_checkpoint_entry(checkpoint, get_entry_key(checkpoint, "ACGTA")) is not None:
+            print("Test 62 failed")
+            checkpoint_test = False
+        close_checkpoint(checkpoint, False)
+
+        # Testing the entries of other parameters, removed once a run is complete
+        checkpoint = open_checkpoint(checkpoint_file, "genome", dict(checkpoint_parameters, deaminase_window=[14, 21]))
+        if get_checkpoint_entry(checkpoint, get_entry_key(checkpoint, "ACGT")) is not None:
+            print("Test 63 failed")
+            checkpoint_test = False
+        close_checkpoint(checkpoint, True)
+        checkpoint = open_checkpoint(checkpoint_file, "genome", checkpoint_parameters)
+        if get_checkpoint_entry(checkpoint, get_entry_key(checkpoint, "ACGT")) is not None:
+            print("Test 64 failed")
+            checkpoint_test = False
+        close_checkpoint(checkpoint, False)
+
+    # Testing an analysis interrupted after the sweep of its first entry, resumed from the checkpoint without sweeping this entry again
+    with tempfile.TemporaryDirectory() as checkpoint_directory:
+        resume_genes = ["ATGCAGTTACGATCGATCATGAGGTAA", "ATGCAGTTACGTACGTACATGAGGTAA", "ATGCAGAAACGATCGATCATGAGGTAA"]
+        with open(os.path.join(checkpoint_directory, "genes.fasta"), "w") as file:
+            file.write("".join(f">gene_{i}\n{gene}\n" for i, gene in enumerate(resume_genes)))
+        with open(os.path.join(checkpoint_directory, "genome.fa"), "w") as file:
+            file.write(">genome\n" + "TTTTTTTTTT".join(resume_genes) + "TTTTTTTTTT\n")
+        resume_file = os.path.join(checkpoint_directory, "results_genes.txt")
+        default_batch_entries = identifier.batch_entries
+        identifier.index_cache_directory, identifier.off_target_cache_file, identifier.checkpoint_runs, identifier.batch_entries = None, None, True, 1
+        analyse_fasta_file(checkpoint_directory, "genes.fasta", "genome.fa", True, [coding_target], pams, deaminase_window, 13, 1, 1, True)
+        with open(resume_file) as file:
+            expected = file.read()
+        os.remove(resume_file)
+        os.remove(os.path.join(checkpoint_directory, get_checkpoint_name("genes.fasta")))
+
+        swept_sequences = []
+        def gather_first_sweep(sequences, tasks, batch_results, results):
+            if len(swept_sequences) > 0:
+                raise RuntimeError("Interrupted analysis")
+            swept_sequences.extend(sequences)
+            gather_batch_results(sequences, tasks, batch_results, results)
+        identifier.gather_batch_results = gather_first_sweep
+        try:
+            analyse_fasta_file(checkpoint_directory, "genes.fasta", "genome.fa", True, [coding_target], pams, deaminase_window, 13, 1, 1, True)
+        except RuntimeError:
+            pass
+        finally:
+            identifier.gather_batch_results = gather_batch_results
+        first_sequences = list(swept_sequences)
+
+        def gather_sweep(sequences, tasks, batch_results, results):
+            swept_sequences.extend(sequences)
+            gather_batch_results(sequences, tasks, batch_results, results)
+        swept_sequences = []
+        identifier.gather_batch_results = gather_sweep
+        try:
+            analyse_fasta_file(checkpoint_directory, "genes.fasta", "genome.fa", True, [coding_target], pams, deaminase_window, 13, 1, 1, True)
+        finally:
+            identifier.gather_batch_results = gather_batch_results
+            identifier.batch_entries = default_batch_entries
+        first_keys = {get_candidate_key(sequence) for sequence in first_sequences}
+        if len(first_keys) == 0 or len(swept_sequences) == 0 or any(get_candidate_key(sequence) in first_keys for sequence in swept_sequences):
+            print("Test 88 failed")
+            checkpoint_test = False
+        with open(resume_file) as file:
+            if file.read() != expected:
+                print("Test 89 failed")
+                checkpoint_test = False
+
+        # Testing an unreadable checkpoint, discarded and the entries analysed again
+        with open(os.path.join(checkpoint_directory, get_checkpoint_name("genes.fasta")), "wb") as file:
+            file.write(b"not a checkpoint" * 100)
+        analyse_fasta_file(checkpoint_directory, "genes.fasta", "genome.fa", True, [coding_target], pams, deaminase_window, 13, 1, 1, True)
+        with open(resume_file) as file:
+            if file.read() != expected:
+                print("Test 96 failed")
+                checkpoint_test = False
+
+        # Testing the shared reference index released when the analysis fails before starting the pool
+        shared_blocks = []
+        def share_index(reference_index):
+            shared_blocks.append(share_reference_index(reference_index)[0])
+            return shared_blocks[-1], {"name": shared_blocks[-1].name}
+        def fail_checkpoint(path, genome_key, parameters):
+            raise sqlite3.OperationalError("unable to open database file")
+        identifier.share_reference_index, identifier.open_checkpoint = share_index, fail_checkpoint
+        try:
+            analyse_fasta_file(checkpoint_directory, "genes.fasta", "genome.fa", True, [coding_target], pams, deaminase_window, 13, 1, 1, True)
+            print("Test 97 failed")
+            checkpoint_test = False
+        except sqlite3.OperationalError:
+            try:
+                SharedMemory(name=shared_blocks[0].name).close()
+                print("Test 97 failed")
+                checkpoint_test = False
+            except FileNotFoundError:
+                pass
+        finally:
+            identifier.share_reference_index, identifier.open_checkpoint = share_reference_index, open_checkpoint
+
+        # Testing the off-targets released once all the entries are written, no future of the search keeping its results in both modes
+        def count_results(files, entries, results, contig_sizes, checkpoint = None, screening = None, references = None):
+            written = write_ready_entries(files, entries, results, contig_sizes, checkpoint, screening, references)
+            if len(entries) == 0:
+                gc.collect()
+                held_results.append(sum(1 for obj in gc.get_objects() if isinstance(obj, Future) and obj.done() and not obj.cancelled() and obj.exception() is None and isinstance(obj.result(), tuple)))
+            return written
+        identifier.checkpoint_runs, identifier.batch_entries, identifier.write_ready_entries = False, 1, count_results
+        try:
+            for batch in (False, True):
+                held_results = []
+                analyse_fasta_file(checkpoint_directory, "genes.fasta", "genome.fa", True, [coding_target], pams, deaminase_window, 13, 1, 1, batch)
+                if len(held_results) == 0 or held_results[-1] != 0:
+                    print("Test 99 failed")
+                    checkpoint_test = False
+        finally:
+            identifier.checkpoint_runs, identifier.batch_entries, identifier.write_ready_entries = True, default_batch_entries, write_ready_entries
+
+    if checkpoint_test:
+        print("All checkpoint tests passed")
+
+    ###############################################################
+
+    metrics_test = True
+
+    # Testing the counters of the search, only recorded when the metrics are collected
+    test_candidate["sequence"] = "CAGTTACGATCGATCATGAGG"
+    reset_metrics()
+    search_off_target(test_candidate, seed_index["coding"], 13, 1, 1)
+    if reset_metrics()["counters"] != {}:
+        print("Test 65 failed")
+        metrics_test = False
+    identifier.collect_metrics = True
+    found = search_off_target(test_candidate, seed_index["coding"], 13, 1, 1)
+    identifier.collect_metrics = False
+    counters = reset_metrics()["counters"]
+    if counters.get("off_targets_found") != len(found) or not counters.get("extensions", 0) <= counters.get("pam_sites_visited", 0):
+        print("Test 66 failed")
+        metrics_test = False
+
+    # Testing the busy and idle time of the workers
+    analysis_metrics = {"timers": {}, "counters": {}, "workers": {}, "candidates": {">gene": [("CAG", "NGG")]}}
+    merge_metrics(analysis_metrics, {"timers": {}, "counters": {"extensions": 2}, "worker": 1, "busy": 1.5})
+    merge_metrics(analysis_metrics, {"timers": {}, "counters": {"extensions": 3}, "worker": 1, "busy": 0.5})
+    summary = summarize_metrics(analysis_metrics, {("CAG", "NGG"): 1.0}, 3.0, 2.5)
+    if summary["counters"]["extensions"] != 5 or summary["workers"]["1"] != {"busy": 2.0, "tasks": 2, "idle": 0.5} or summary["slowest_entries"] != [{"entry": ">gene", "seconds": 1.0}]:
+        print("Test 67 failed")
+        metrics_test = False
+
+    if metrics_test:
+        print("All metrics tests passed")
+
+    ###############################################################
+
+    screening_test = True
+
+    # Testing the search stopped as soon as the off-target budget is exceeded
+    test_candidate["sequence"] = "CAG123456789012345NGG"
+    screening_strand = index_genome_strand("XXXCAG123456789012345NGG" * 6, ["NGG"])
+    if len(search_off_target(test_candidate, screening_strand, 13, 0, 0)) != 6 or len(search_off_target(test_candidate, screening_strand, 13, 0, 0, 2)) != 3:
+        print("Test 68 failed")
+        screening_test = False
+    if [len(off_targets) for off_targets in search_off_target_batch([test_candidate, dict(test_candidate, sequence="CAG999999999999999NGG")], screening_strand, 13, 0, 0, 2)] != [3, 0]:
+        print("Test 69 failed")
+        screening_test = False
+
+    # Testing the specificity score, the first exact replica being the target itself
+    replica = {"sequence": "CAG123456789012345NGG", "concordance": 18}
+    off_target = {"sequence": "CAG1234567890123*5NGG", "concordance": 9}
+    if score_candidate(test_candidate, [replica], []) != (0, 100.0) or score_candidate(test_candidate, [replica], [replica, off_target]) != (2, 40.0):
+        print("Test 70 failed")
+        screening_test = False
+
+    # Testing the candidates over the budget discarded and the others ranked by specificity
+    screening_sequences = [{"sequence": "CAG123456789012345NGG", "id": id} for id in range(3)]
+    screened = screen_entry(screening_sequences, [[replica, replica, replica], [replica, off_target], [replica]], [[], [], []], 1, 1)
+    if [sequence["id"] for sequence in screened[0]] != [2] or screened[3] != [100.0]:
+        print("Test 71 failed")
+        screening_test = False
+    if [sequence["id"] for sequence in screen_entry(screening_sequences, [[replica, replica, replica], [replica, off_target], [replica]], [[], [], []], None, None)[0]] != [2, 1, 0]:
+        print("Test 72 failed")
+        screening_test = False
+
+    if screening_test:
+        print("All screening tests passed")
+
+    ###############################################################
+
+    sweep_test = True
+
+    # Testing the configurations of a sweep, every combination of the swept values
+    sweep_parameters = {"targets": [coding_target], "pams": pams, "deaminase_window": deaminase_window, "concordance_threshold": 13, "allowed_mismatches": 1, "allowed_gaps": 1}
+    configurations = get_sweep_configurations({"concordance_threshold": [13, 15], "allowed_mismatches": [0, 1]}, sweep_parameters)
+    if len(configurations) != 4 or configurations[1] != dict(sweep_parameters, concordance_threshold=13, allowed_mismatches=1):
+        print("Test 73 failed")
+        sweep_test = False
+    try:
+        get_sweep_configurations({"threshold": [13]}, sweep_parameters)
+        print("Test 74 failed")
+        sweep_test = False
+    except ValueError:
+        pass
+
+    # Testing the off-targets of stricter parameters filtered from the ones of looser parameters
+    test_candidate["sequence"] = "CAGTTACGATCGATCATGAGG"
+    loose_off_targets = search_off_target(test_candidate, seed_index["coding"], 12, 2, 1)
+    if filter_off_targets(loose_off_targets, 13, 1, 0) != search_off_target(test_candidate, seed_index["coding"], 13, 1, 0):
+        print("Test 75 failed")
+        sweep_test = False
+
+    # Testing the summary of each configuration, the mutated copy of the gene being an off-target with a mismatch only
+    with tempfile.TemporaryDirectory() as sweep_directory:
+        sweep_gene = "ATGCAGTTACGATCGATCATGAGGTAA"
+        with open(os.path.join(sweep_directory, "genes.fasta"), "w") as file:
+            file.write(f">gene\n{sweep_gene}\n")
+        with open(os.path.join(sweep_directory, "genome.fa"), "w") as file:
+            file.write(f">genome\nTTTTTTTTTT{sweep_gene}TTTTTTTTTT{sweep_gene.replace('GATCGATC', 'GATCCATC')}TTTTTTTTTT\n")
+        identifier.index_cache_directory, identifier.off_target_cache_file = None, None
+        summary = sweep_fasta_file(sweep_directory, "genes.fasta", "genome.fa", True, configurations[:2], 1)
+        if [(row["nb_KO"], row["nb_targets"], row["nb_specific_targets"]) for row in summary] != [(1, 2, 2), (1, 2, 0)] or not os.path.exists(os.path.join(sweep_directory, "results_genes.sweep.tsv")):
+            print("Test 76 failed")
+            sweep_test = False
+
+    if sweep_test:
+        print("All sweep tests passed")
+
+    ###############################################################
+
+    library_test = True
+
+    # Testing the queries on a genome opened once, the identical sequences being searched once
+    with tempfile.TemporaryDirectory() as library_directory:
+        with open(os.path.join(library_directory, "genome.fa"), "w") as file:
+            file.write(f">genome\nTTTTTTTTTT{sweep_gene}TTTTTTTTTT{sweep_gene.replace('GATCGATC', 'GATCCATC')}TTTTTTTTTT\n")
+        reference = open_reference(os.path.join(library_directory, "genome.fa"), pams, get_seed_length(13, 1, 1))
+        pool = create_pool(2)
+        try:
+            library_parameters = dict(sweep_parameters, attached_references=1)
+            library_sequences = find_candidates(compile_candidate_finder([coding_target], pams, deaminase_window), sweep_gene)
+            library_results = search_sequences(reference, library_sequences + library_sequences[:1], library_parameters, pool, 2)
+            expected = [(search_contigs(sequence, reference["reference_index"], "coding", library_parameters), search_contigs(sequence, reference["reference_index"], "complementary", library_parameters)) for sequence in library_sequences]
+            if library_results != expected + expected[:1]:
+                print("Test 77 failed")
+                library_test = False
+            records = identify_entries(reference, [(">gene", sweep_gene), (">empty", "TTT")], library_parameters, pool, 2)
+            if records != [get_entry_records(">gene", library_sequences, [result[0] for result in expected], [result[1] for result in expected], reference["contig_sizes"]), []]:
+                print("Test 78 failed")
+                library_test = False
+        finally:
+            stop_pool(pool)
+            close_reference(reference)
+
+    if library_test:
+        print("All library tests passed")
+
+    ###############################################################
+
+    service_test = True
+
+    # Testing the configuration of the service, the command line overrides replacing the values of the file which replace the default ones
+    with tempfile.TemporaryDirectory() as service_directory:
+        with open(os.path.join(service_directory, "service.json"), "w") as file:
+            json.dump({"port": 9000, "nb_processes": 3, "genomes": {"first": "first.fa"}, "parameters": {"concordance_threshold": 15}}, file)
+        configuration = service.load_configuration(os.path.join(service_directory, "service.json"), {"port": 9001, "nb_processes": None, "genomes": {"second": "second.fa"}, "parameters": {"allowed_mismatches": 0}})
+        if (configuration["port"], configuration["nb_processes"], configuration["genomes"]) != (9001, 3, {"first": "first.fa", "second": "second.fa"}) or \
+           (configuration["parameters"]["concordance_threshold"], configuration["parameters"]["allowed_mismatches"], configuration["parameters"]["pams"]) != (15, 0, identifier.pams):
+            print("Test 90 failed")
+            service_test = False
+        for overrides in ({"unknown": 1}, {"parameters": {"nb_processes": 1}}):
+            try:
+                service.load_configuration(None, overrides)
+                print("Test 91 failed")
+                service_test = False
+            except ValueError:
+                pass
+
+    # Testing the routing of the queries and the status codes of their answers
+    with tempfile.TemporaryDirectory() as service_directory:
+        with open(os.path.join(service_directory, "genome.fa"), "w") as file:
+            file.write(f">genome\nTTTTTTTTTT{sweep_gene}TTTTTTTTTT{sweep_gene.replace('GATCGATC', 'GATCCATC')}TTTTTTTTTT\n")
+        test_service = service.start_service(service.load_configuration(None, {"genomes": {"genome": os.path.join(service_directory, "genome.fa")}, "nb_processes": 1, "max_concurrency": 1,
+                                                                               "queue_timeout": 0, "max_batch_size": 2, "parameters": {"targets": [coding_target], "pams": pams}}))
+        try:
+            candidates = service.handle_query(test_service, "/candidates", {"entries": [{"name": "gene", "sequence": sweep_gene.lower()}]})
+            identified = service.handle_query(test_service, "/identify", {"entries": [{"name": "gene", "sequence": sweep_gene}]})
+            guides = service.handle_query(test_service, "/off_targets", {"guides": [{"sequence": identified["entries"][0]["candidates"][0]["sequence"]}]})
+            if candidates["entries"][0]["candidates"] != find_candidates(compile_candidate_finder([coding_target], pams, deaminase_window), sweep_gene) or \
+               [{key: record[key] for key in ("replicas", "off_targets")} for record in guides["guides"]] != [{key: identified["entries"][0]["candidates"][0][key] for key in ("replicas", "off_targets")}]:
+                print("Test 92 failed")
+                service_test = False
+            try:
+                service.handle_query(test_service, "/unknown", {})
+                print("Test 93 failed")
+                service_test = False
+            except LookupError:
+                pass
+
+            queries = [("/candidates", b'{"entries": [{"name": "gene", "sequence": "ATG"}]}', 200),
+                       ("/candidates", b"[1]", 400),
+                       ("/candidates", b"{", 400),
+                       ("/candidates", b'{"entries": [], "parameters": [1]}', 400),
+                       ("/candidates", b'{"entries": [], "parameters": {"nb_processes": 1}}', 400),
+                       ("/off_targets", b'{"genome": "unknown", "guides": []}', 400),
+                       ("/unknown", b"{}", 404),
+                       ("/candidates", b'{"entries": [], "parameters": {"concordance_threshold": "13"}}', 400),
+                       ("/candidates", b'{"entries": [], "parameters": {"targets": [["CAG", 3, "coding"]]}}', 400),
+                       ("/candidates", b'{"entries": [{"name": "gene", "sequence": 1}]}', 400),
+                       ("/candidates", b'{"entries": [1]}', 400),
+                       ("/off_targets", b'{"genome": ["genome"], "guides": []}', 400),
+                       ("/off_targets", b'{"guides": [{"sequence": "CAGTTACGATCGATCATGAGG", "pam": 1}]}', 400),
+                       ("/off_targets", b'{"guides": [{"sequence": "AGG"}]}', 400),
+                       ("/candidates", b'{"entries": [{}, {}, {}]}', 413)]
+            if [service.answer_query(test_service, path, content)[0] for path, content, _ in queries] != [status for _, _, status in queries]:
+                print("Test 94 failed")
+                service_test = False
+
+            # Testing the errors of the search of a valid query, answered as internal errors
+            def fail_query(service_query, path, checked):
+                raise TypeError("internal error")
+            run_query = service.run_query
+            service.run_query = fail_query
+            try:
+                if service.answer_query(test_service, "/candidates", b'{"entries": []}')[0] != 500:
+                    print("Test 100 failed")
+                    service_test = False
+            finally:
+                service.run_query = run_query
+            test_service["semaphore"].acquire()
+            status = service.answer_query(test_service, "/candidates", b'{"entries": []}')[0]
+            test_service["semaphore"].release()
+            if status != 503 or list(service.get_status(test_service)["genomes"]) != ["genome"]:
+                print("Test 95 failed")
+                service_test = False
+        finally:
+            service.stop_service(test_service)
+
+    if service_test:
+        print("All service tests passed")
+
+    ###############################################################
+
+    shard_test = True
+
+    # Testing the shards of the contigs laid end to end, each PAM site belonging to a single shard
+    if [get_shard_ranges([10, 5], shard, 3) for shard in range(3)] != [[(0, 5), (0, 0)], [(5, 10), (0, 0)], [(10, 10), (0, 5)]]:
+        print("Test 79 failed")
+        shard_test = False
+
+    # Testing the off-targets of the shards, the window of the off-target overlapping the origin wrapping around the circular genome
+    test_candidate["sequence"] = "CAGTTACGATCGATCATGAGG"
+    shard_reference = build_reference_index([{"name": "genome", "circular": True, "sequence": "AGGTTTTTTTTCAGTTACGATCGATCATG" * 2}], pams, get_seed_length(13, 1, 1))
+    shard_parameters = {"concordance_threshold": 13, "allowed_mismatches": 1, "allowed_gaps": 1}
+    shard_results = [process_chunk(shard_reference, shard_parameters, [test_candidate], (shard, 4)) for shard in range(4)]
+    shard_tasks = [(None, [test_candidate], 0, 4)] * 4
+    sharded_results = {}
+    gathered = [gather_chunk_results(shard_tasks, shard, shard_results[shard], sharded_results) for shard in range(4)]
+    if gathered[:3] != [None] * 3 or sharded_results != {}:
+        print("Test 80 failed")
+        shard_test = False
+    if gathered[3] != process_chunk(shard_reference, shard_parameters, [test_candidate]) or len(shard_results[0][0][0]) != 1:
+        print("Test 81 failed")
+        shard_test = False
+    batch_shards = [process_batch(shard_reference, shard_parameters, 0, "coding", [test_candidate], (shard, 4))[0] for shard in range(4)]
+    if [off_target for off_targets in batch_shards for off_target in off_targets] != process_batch(shard_reference, shard_parameters, 0, "coding", [test_candidate])[0]:
+        print("Test 82 failed")
+        shard_test = False
+
+    if shard_test:
+        print("All genome shard tests passed")